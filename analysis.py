@@ -3,80 +3,122 @@ import os
 
 import matplotlib
 matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
 import pandas as pd
+from PIL import Image
+from sqlalchemy import select
 
 import config
-from db import SessionLocal, get_all_properties, get_estimates_for_property, get_sales_with_estimates
+from db import Estimate, Property, ReadSession, engine, get_sales_with_estimates
 
 logger = logging.getLogger(__name__)
 
+# Let Agg draw long paths in chunks rather than one huge path
+matplotlib.rcParams["agg.path.chunksize"] = 10000
+
+# One Figure per plot, reused across calls in a long-lived process
+_FIG_CACHE = {}
+
+
+def _get_figure(name: str, figsize: tuple) -> Figure:
+    """Return a cleared, reusable Figure for the named plot.
+
+    Figures live on a bare Agg canvas outside pyplot's figure manager, so
+    repeated reports skip figure/canvas construction and nothing needs closing.
+    """
+    fig = _FIG_CACHE.get(name)
+    if fig is None:
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        _FIG_CACHE[name] = fig
+    else:
+        fig.clear()
+    fig.set_size_inches(*figsize)
+    return fig
+
+
+def _save_fig(fig, path: str, dpi: int = 150):
+    """Render fig once on the Agg canvas and write the pixels straight to PNG.
+
+    Cheaper than fig.savefig, which re-renders through its own PNG writer at
+    the default zlib level; these plots don't need maximum compression.
+    """
+    fig.set_dpi(dpi)
+    fig.canvas.draw()
+    image = Image.fromarray(np.asarray(fig.canvas.buffer_rgba()))
+    image.save(path, format="PNG", compress_level=1, optimize=False)
+
 
 def _get_estimates_df() -> pd.DataFrame:
     """Load all estimates into a DataFrame."""
-    session = SessionLocal()
-    try:
-        props = get_all_properties(session)
-        rows = []
-        for prop in props:
-            for est in prop.estimates:
-                rows.append({
-                    "property_id": prop.id,
-                    "address": prop.address,
-                    "unit_number": prop.unit_number,
-                    "source": est.source,
-                    "estimated_price": est.estimated_price,
-                    "captured_at": est.captured_at,
-                })
-        return pd.DataFrame(rows)
-    finally:
-        session.close()
+    stmt = (
+        select(
+            Property.id.label("property_id"),
+            Property.address,
+            Property.unit_number,
+            Estimate.source,
+            Estimate.estimated_price,
+            Estimate.captured_at,
+        )
+        .join(Estimate, Estimate.property_id == Property.id)
+        .order_by(Property.unit_number, Estimate.captured_at)
+    )
+    return pd.read_sql_query(stmt, engine, parse_dates=["captured_at"])
 
 
 def _get_errors_df() -> pd.DataFrame:
     """Load sales-vs-estimates error data into a DataFrame."""
-    session = SessionLocal()
+    session = ReadSession()
     try:
-        data = get_sales_with_estimates(session)
-        return pd.DataFrame(data)
+        df = pd.DataFrame(get_sales_with_estimates(session))
     finally:
         session.close()
+    if not df.empty:
+        # Native datetime64 columns so the plots don't handle object dtype
+        df["sale_date"] = pd.to_datetime(df["sale_date"])
+        df["estimate_date"] = pd.to_datetime(df["estimate_date"])
+    return df
 
 
-def calculate_errors() -> dict:
+def calculate_errors(df: pd.DataFrame = None) -> dict:
     """Calculate median and mean error by source."""
-    df = _get_errors_df()
+    if df is None:
+        df = _get_errors_df()
     if df.empty:
         logger.warning("No sales/estimate data available for error calculation")
         return {}
 
-    results = {}
-    for source in df["source"].unique():
-        subset = df[df["source"] == source]
-        results[source] = {
-            "count": len(subset),
-            "mean_error": subset["error"].mean(),
-            "median_error": subset["error"].median(),
-            "mean_pct_error": subset["pct_error"].mean(),
-            "median_pct_error": subset["pct_error"].median(),
-            "std_error": subset["error"].std(),
-            "std_pct_error": subset["pct_error"].std(),
-        }
-    return results
-
-
-def estimate_vs_actual_timeseries(save_path: str = None):
+    # sort=False keeps sources in order of first appearance, as unique() did
+    stats = df.groupby("source", sort=False).agg(
+        count=("error", "size"),
+        mean_error=("error", "mean"),
+        median_error=("error", "median"),
+        mean_pct_error=("pct_error", "mean"),
+        median_pct_error=("pct_error", "median"),
+        std_error=("error", "std"),
+        std_pct_error=("pct_error", "std"),
+    )
+    return stats.to_dict(orient="index")
+
+
+def estimate_vs_actual_timeseries(save_path: str = None, df: pd.DataFrame = None):
     """Generate a time-series plot of estimates vs actual sale prices."""
-    df = _get_errors_df()
+    if df is None:
+        df = _get_errors_df()
     if df.empty:
         logger.warning("No data for time-series plot")
         return
 
-    fig, ax = plt.subplots(figsize=(12, 6))
+    fig = _get_figure("timeseries", (12, 6))
+    ax = fig.subplots()
 
+    # Sort once, then slice each source out of the presorted frame
+    df = df.sort_values("sale_date", kind="stable")
+    sources = df["source"].to_numpy()
     for source, color in [("zillow", "blue"), ("redfin", "red")]:
-        subset = df[df["source"] == source].sort_values("sale_date")
+        subset = df.iloc[(sources == source).nonzero()[0]]
         if subset.empty:
             continue
         ax.plot(subset["sale_date"], subset["estimated_price"], "o-", color=color,
@@ -89,23 +131,24 @@ def estimate_vs_actual_timeseries(save_path: str = None):
     ax.set_title("Estimates vs Actual Sale Prices Over Time")
     ax.legend()
     ax.grid(True, alpha=0.3)
-    plt.tight_layout()
+    fig.tight_layout()
 
     save_path = save_path or os.path.join(config.DATA_DIR, "timeseries.png")
-    fig.savefig(save_path, dpi=150)
-    plt.close(fig)
+    _save_fig(fig, save_path)
     logger.info("Saved time-series plot to %s", save_path)
 
 
-def accuracy_scatter(save_path: str = None):
+def accuracy_scatter(save_path: str = None, df: pd.DataFrame = None):
     """Generate scatter plots of estimated vs actual price with trend lines."""
-    df = _get_errors_df()
+    if df is None:
+        df = _get_errors_df()
     if df.empty:
         logger.warning("No data for scatter plot")
         return
 
     sources = df["source"].unique()
-    fig, axes = plt.subplots(1, len(sources), figsize=(7 * len(sources), 6), squeeze=False)
+    fig = _get_figure("accuracy_scatter", (7 * len(sources), 6))
+    axes = fig.subplots(1, len(sources), squeeze=False)
 
     for i, source in enumerate(sources):
         ax = axes[0, i]
@@ -120,10 +163,17 @@ def accuracy_scatter(save_path: str = None):
 
         # Trend line
         if len(subset) >= 2:
-            z = np.polyfit(subset["sale_price"], subset["estimated_price"], 1)
-            p = np.poly1d(z)
-            x_line = np.linspace(min_val, max_val, 100)
-            ax.plot(x_line, p(x_line), "r-", alpha=0.5, label=f"Trend (slope={z[0]:.2f})")
+            # Closed-form least-squares line; no need for polyfit's SVD
+            sx = subset["sale_price"].to_numpy()
+            sy = subset["estimated_price"].to_numpy()
+            dx = sx - sx.mean()
+            var_x = (dx ** 2).sum()
+            if var_x > 0:
+                slope = (dx * (sy - sy.mean())).sum() / var_x
+                intercept = sy.mean() - slope * sx.mean()
+                x_line = np.linspace(min_val, max_val, 100)
+                ax.plot(x_line, intercept + slope * x_line, "r-", alpha=0.5,
+                        label=f"Trend (slope={slope:.2f})")
 
         ax.set_xlabel("Actual Sale Price ($)")
         ax.set_ylabel("Estimated Price ($)")
@@ -131,26 +181,52 @@ def accuracy_scatter(save_path: str = None):
         ax.legend()
         ax.grid(True, alpha=0.3)
 
-    plt.tight_layout()
+    fig.tight_layout()
     save_path = save_path or os.path.join(config.DATA_DIR, "accuracy_scatter.png")
-    fig.savefig(save_path, dpi=150)
-    plt.close(fig)
+    _save_fig(fig, save_path)
     logger.info("Saved scatter plot to %s", save_path)
 
 
-def error_distribution(save_path: str = None):
+def _box_stats(values: np.ndarray, label: str, whis: float = 1.5) -> dict:
+    """Box-plot stats for ax.bxp, matching ax.boxplot's defaults.
+
+    Quartiles come from one np.quantile call; whiskers reach the most extreme
+    points within whis * IQR of the box and anything beyond is a flier.
+    """
+    q1, med, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - whis * iqr) & (values <= q3 + whis * iqr)]
+    whislo, whishi = (inside.min(), inside.max()) if inside.size else (q1, q3)
+    # As in cbook.boxplot_stats: whiskers never end inside the box
+    whislo, whishi = min(whislo, q1), max(whishi, q3)
+    return {
+        "label": label,
+        "med": med,
+        "q1": q1,
+        "q3": q3,
+        "whislo": whislo,
+        "whishi": whishi,
+        "fliers": values[(values < whislo) | (values > whishi)],
+    }
+
+
+def error_distribution(save_path: str = None, df: pd.DataFrame = None):
     """Generate box plots of percentage errors by source."""
-    df = _get_errors_df()
+    if df is None:
+        df = _get_errors_df()
     if df.empty:
         logger.warning("No data for error distribution plot")
         return
 
-    fig, ax = plt.subplots(figsize=(8, 6))
+    fig = _get_figure("error_distribution", (8, 6))
+    ax = fig.subplots()
 
-    sources = sorted(df["source"].unique())
-    data = [df[df["source"] == s]["pct_error"].values for s in sources]
+    stats = [
+        _box_stats(values.to_numpy(), label=source.title())
+        for source, values in df.groupby("source")["pct_error"]
+    ]
 
-    bp = ax.boxplot(data, labels=[s.title() for s in sources], patch_artist=True)
+    bp = ax.bxp(stats, patch_artist=True)
     colors = ["#4A90D9", "#D94A4A", "#4AD94A", "#D9D94A"]
     for patch, color in zip(bp["boxes"], colors):
         patch.set_facecolor(color)
@@ -160,11 +236,10 @@ def error_distribution(save_path: str = None):
     ax.set_ylabel("Percentage Error (%)")
     ax.set_title("Distribution of Estimate Errors by Source")
     ax.grid(True, alpha=0.3, axis="y")
-    plt.tight_layout()
+    fig.tight_layout()
 
     save_path = save_path or os.path.join(config.DATA_DIR, "error_distribution.png")
-    fig.savefig(save_path, dpi=150)
-    plt.close(fig)
+    _save_fig(fig, save_path)
     logger.info("Saved error distribution plot to %s", save_path)
 
 
@@ -172,8 +247,12 @@ def generate_report():
     """Generate summary statistics and all plots."""
     print("\n=== Woodgate Estimate Accuracy Report ===\n")
 
+    # Load once and share across the stats and plots below
+    err_df = _get_errors_df()
+    est_df = _get_estimates_df()
+
     # Summary statistics
-    errors = calculate_errors()
+    errors = calculate_errors(err_df)
     if not errors:
         print("No sales data with matching estimates yet.")
         print("Add sales with 'python main.py add-sale' and ensure estimates exist.\n")
@@ -190,13 +269,12 @@ def generate_report():
             print()
 
         # Generate plots
-        estimate_vs_actual_timeseries()
-        accuracy_scatter()
-        error_distribution()
+        estimate_vs_actual_timeseries(df=err_df)
+        accuracy_scatter(df=err_df)
+        error_distribution(df=err_df)
         print(f"Plots saved to {config.DATA_DIR}/")
 
     # Estimates summary
-    est_df = _get_estimates_df()
     if not est_df.empty:
         print(f"\nTotal estimates collected: {len(est_df)}")
         print(f"Properties with estimates: {est_df['property_id'].nunique()}")
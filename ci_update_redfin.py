@@ -13,10 +13,21 @@ import random
 import re
 import sys
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from operator import itemgetter
+from statistics import fmean
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # stdlib json produces the same file, just more slowly
+    orjson = None
 
 # --- User-Agent pool (copied from config.py to avoid importing heavy deps) ---
 USER_AGENTS = [
@@ -29,6 +40,8 @@ USER_AGENTS = [
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROPERTIES_CSV = os.path.join(BASE_DIR, "properties.csv")
 DATA_JSON = os.path.join(BASE_DIR, "docs", "data.json")
+# Same switch as config.EXPORT_PRETTY: compact output unless EXPORT_PRETTY=1
+EXPORT_PRETTY = os.environ.get("EXPORT_PRETTY") == "1"
 
 # --- Pacing to avoid tripping Redfin's anti-bot blocking ---
 REQUEST_DELAY_RANGE = (2.0, 5.0)     # jitter between individual requests
@@ -38,6 +51,7 @@ BACKOFF_FAILURE_THRESHOLD = 3         # consecutive failures before backing off
 BACKOFF_BASE_SECONDS = 45.0           # base pause, doubles each time it re-triggers
 BACKOFF_MAX_SECONDS = 300.0
 ABORT_AFTER_CONSECUTIVE_FAILURES = 12  # give up rather than backoff-loop for hours
+MAX_WORKERS = 4                       # requests allowed in flight; starts are still paced
 
 
 def _pace(i, total, consecutive_failures, backoff_level):
@@ -68,31 +82,68 @@ def _pace(i, total, consecutive_failures, backoff_level):
 
 # --- Scraping helpers ---
 
-def _get_headers():
-    return {
-        "User-Agent": random.choice(USER_AGENTS),
+# Patterns used inside the per-property loops, compiled once at import
+_PROPERTY_ID_RE = re.compile(r"/home/(\d+)")
+_DOLLAR_RE = re.compile(r"\$([0-9,]+)")
+_PRICE_RE = re.compile(r"(\d+\.?\d*)\s*([KkMm]?)")
+_PRICE_MULTIPLIERS = {"": 1.0, "K": 1e3, "k": 1e3, "M": 1e6, "m": 1e6}
+_PRICE_K_RE = re.compile(r"(\d+\.?\d*)\s*[Kk]")
+_PRICE_M_RE = re.compile(r"(\d+\.?\d*)\s*[Mm]")
+_PRICE_NUM_RE = re.compile(r"(\d+\.?\d*)")
+_ESTIMATE_RE = re.compile(r"Redfin Estimate[^$]*\$([0-9,]+)", re.IGNORECASE)
+_SALE_DATE_RE = re.compile(r"(\w{3}\s+\d{1,2},\s+\d{4}|\d{1,2}/\d{1,2}/\d{4})")
+_SOLD_RE = re.compile(r"(\d{1,2}/\d{1,2}/\d{4})\s+Sold\s+\$([0-9,]+)", re.IGNORECASE)
+
+# One pooled session for the whole run so requests to redfin.com reuse the
+# same TCP/TLS connections instead of handshaking every time. Deliberately not
+# http_session.make_session(): like USER_AGENTS above, this script stays free
+# of project imports (config sets up logging on import), and its headers come
+# whole from _HEADERS_POOL below rather than from the session.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503]),
+))
+
+
+# Header sets are built once per User-Agent; requests copies headers when it
+# merges them, so handing out these shared dicts is safe as long as callers
+# never mutate them.
+_HEADERS_POOL = [
+    {
+        "User-Agent": ua,
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
         "Accept-Language": "en-US,en;q=0.9",
-        "Accept-Encoding": "gzip, deflate, br",
+        "Accept-Encoding": ACCEPT_ENCODING,  # "br" only if brotli is installed
         "Connection": "keep-alive",
     }
-
-
-def _get_api_headers(referer_url):
-    """Headers for Redfin stingray API requests."""
-    return {
-        "User-Agent": random.choice(USER_AGENTS),
+    for ua in USER_AGENTS
+]
+_API_HEADERS_POOL = [
+    {
+        "User-Agent": ua,
         "Accept": "*/*",
         "Accept-Language": "en-US,en;q=0.9",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Referer": referer_url,
+        "Accept-Encoding": ACCEPT_ENCODING,
         "Connection": "keep-alive",
     }
+    for ua in USER_AGENTS
+]
+
+
+def _get_headers():
+    return random.choice(_HEADERS_POOL)
+
+
+def _get_api_headers(referer_url):
+    """Headers for Redfin stingray API requests."""
+    return {**random.choice(_API_HEADERS_POOL), "Referer": referer_url}
 
 
 def _extract_property_id(redfin_url):
     """Extract the numeric property ID from a Redfin URL like .../home/38879483."""
-    match = re.search(r"/home/(\d+)", redfin_url)
+    match = _PROPERTY_ID_RE.search(redfin_url)
     return match.group(1) if match else None
 
 
@@ -117,7 +168,7 @@ def _scrape_redfin_api(redfin_url):
     )
 
     try:
-        resp = requests.get(
+        resp = SESSION.get(
             api_url,
             headers=_get_api_headers(redfin_url),
             timeout=15,
@@ -143,7 +194,7 @@ def _scrape_redfin_api(redfin_url):
         # Try sectionPreviewText which sometimes has the price
         preview = payload.get("sectionPreviewText", "")
         if preview:
-            price_match = re.search(r"\$([0-9,]+)", preview)
+            price_match = _DOLLAR_RE.search(preview)
             if price_match:
                 return float(price_match.group(1).replace(",", ""))
 
@@ -158,27 +209,64 @@ def _scrape_redfin_api(redfin_url):
         return None
 
 
+# The HTML parser is imported lazily (see _get_html_parser): estimates usually
+# come from the stingray API, and the sales check that parses every page is
+# skipped when Redfin blocks the run. Keep it out of the module-level imports.
+_HTML_PARSER = None
+
+
+def _get_html_parser():
+    global _HTML_PARSER
+    if _HTML_PARSER is None:
+        from selectolax.lexbor import LexborHTMLParser
+        _HTML_PARSER = LexborHTMLParser
+    return _HTML_PARSER
+
+
 def _fetch_page(url):
     try:
-        resp = requests.get(url, headers=_get_headers(), timeout=15)
+        resp = SESSION.get(url, headers=_get_headers(), timeout=15)
         resp.raise_for_status()
-        return BeautifulSoup(resp.text, "lxml")
+        tree = _get_html_parser()(resp.text)
+        # Match BeautifulSoup's get_text(): script/style bodies aren't page text
+        tree.strip_tags(["script", "style"])
+        return tree
     except requests.RequestException as e:
         print(f"  HTML FETCH ERROR: {e}")
         return None
 
 
 def _parse_price(text):
+    """Extract a numeric price from text like '$425,000' or '$425K'.
+
+    A number followed by K wins, else one followed by M, else the first
+    number at all, so bed/bath counts in element text are skipped.
+
+    >>> _parse_price("$425,000")
+    425000.0
+    >>> _parse_price("$1.2M")
+    1200000.0
+    >>> _parse_price("3 beds $425K")
+    425000.0
+    >>> _parse_price("Redfin Estimate 2 bd $1.2M")
+    1200000.0
+    >>> _parse_price("no price") is None
+    True
+    """
     if not text:
         return None
     text = text.strip().replace(",", "").replace("$", "")
-    match = re.search(r"(\d+\.?\d*)\s*[Kk]", text)
+    # Usually the text is just the price: one match settles it
+    match = _PRICE_RE.fullmatch(text)
+    if match:
+        return float(match.group(1)) * _PRICE_MULTIPLIERS[match.group(2)]
+    match = _PRICE_K_RE.search(text)
     if match:
         return float(match.group(1)) * 1000
-    match = re.search(r"(\d+\.?\d*)\s*[Mm]", text)
+    match = _PRICE_M_RE.search(text)
     if match:
         return float(match.group(1)) * 1_000_000
-    match = re.search(r"(\d+\.?\d*)", text)
+    match = _PRICE_NUM_RE.search(text)
     if match:
         return float(match.group(1))
     return None
@@ -186,12 +274,11 @@ def _parse_price(text):
 
 def _scrape_redfin_html(url):
     """Fallback: scrape the Redfin estimate from the HTML page."""
-    soup = _fetch_page(url)
-    if not soup:
+    tree = _fetch_page(url)
+    if tree is None:
         return None
 
-    estimate_pattern = re.compile(r"Redfin Estimate[^$]*\$([0-9,]+)", re.IGNORECASE)
-    match = estimate_pattern.search(soup.get_text())
+    match = _ESTIMATE_RE.search(tree.text())
     if match:
         return _parse_price(match.group(1))
 
@@ -199,9 +286,9 @@ def _scrape_redfin_html(url):
         'div[data-rf-test-id="avmLdpPrice"]',
         'span[class*="EstimatePrice"]',
     ]:
-        el = soup.select_one(selector)
+        el = tree.css_first(selector)
         if el:
-            price = _parse_price(el.get_text())
+            price = _parse_price(el.text())
             if price:
                 return price
 
@@ -216,13 +303,11 @@ def scrape_redfin(url):
     # Try the stingray API first (works better from cloud/CI environments)
     price = _scrape_redfin_api(url)
     if price:
-        print("  (via API)")
         return price, "api"
 
     # Fall back to HTML scraping
     price = _scrape_redfin_html(url)
     if price:
-        print("  (via HTML)")
         return price, "html"
 
     return None, None
@@ -236,20 +321,22 @@ def _scrape_redfin_sales(url):
     """
     from datetime import datetime as _dt
 
-    soup = _fetch_page(url)
-    if not soup:
+    tree = _fetch_page(url)
+    if tree is None:
         return None
 
     sales = []
 
     # Approach 1: structured table rows (various Redfin layouts)
-    for row in soup.select(".BasicTable__row, [data-rf-test-id='sale-history'] tr, tr"):
-        cells = row.select("td, th")
-        row_text = " ".join(c.get_text(" ", strip=True) for c in cells)
+    # A row can match several selectors in the list; keep each node once
+    rows = dict.fromkeys(tree.css(".BasicTable__row, [data-rf-test-id='sale-history'] tr, tr"))
+    for row in rows:
+        cells = row.css("td, th")
+        row_text = " ".join(c.text(separator=" ", strip=True) for c in cells)
         if "sold" not in row_text.lower():
             continue
-        date_match = re.search(r"(\w{3}\s+\d{1,2},\s+\d{4}|\d{1,2}/\d{1,2}/\d{4})", row_text)
-        price_match = re.search(r"\$([0-9,]+)", row_text)
+        date_match = _SALE_DATE_RE.search(row_text)
+        price_match = _DOLLAR_RE.search(row_text)
         if not (date_match and price_match):
             continue
         raw_date = date_match.group(1)
@@ -268,12 +355,8 @@ def _scrape_redfin_sales(url):
         return sales
 
     # Approach 2: regex over full page text
-    text = soup.get_text(" ")
-    for m in re.finditer(
-        r"(\d{1,2}/\d{1,2}/\d{4})\s+Sold\s+\$([0-9,]+)",
-        text,
-        re.IGNORECASE,
-    ):
+    text = tree.text(separator=" ")
+    for m in _SOLD_RE.finditer(text):
         try:
             sale_date = _dt.strptime(m.group(1), "%m/%d/%Y").strftime("%Y-%m-%d")
             price = int(m.group(2).replace(",", ""))
@@ -337,32 +420,102 @@ def detect_new_sales(props, existing_sales):
     return new_sales
 
 
+def scrape_estimates(props):
+    """Scrape the Redfin estimate for each property on a small thread pool.
+
+    Request starts are still spaced out by _pace(), so the load on Redfin is
+    unchanged; the pool only lets each request's network wait overlap the
+    pause before the next one. Results are consumed in submission order so
+    the backoff/abort logic sees the same sequence of failures as before.
+
+    Returns (results, blocked) where results maps unit -> (price, method)
+    for every property that was attempted.
+    """
+    results = {}
+    in_flight = deque()
+    consecutive_failures = 0
+    backoff_level = 0
+    aborted = False
+
+    def _collect(wait):
+        nonlocal consecutive_failures
+        while in_flight and (wait or in_flight[0][1].done()):
+            prop, future = in_flight.popleft()
+            price, method = future.result()
+            results[prop["unit"]] = (price, method)
+            if price:
+                print(f"  Unit {prop['unit']} -> ${price:,.0f} (via {method.upper()})")
+                consecutive_failures = 0
+            else:
+                print(f"  Unit {prop['unit']} -> FAILED")
+                consecutive_failures += 1
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for i, prop in enumerate(props):
+            print(f"[{i+1}/{len(props)}] Unit {prop['unit']}: {prop['redfin_url']}")
+            in_flight.append((prop, pool.submit(scrape_redfin, prop["redfin_url"])))
+            _collect(wait=False)
+
+            if consecutive_failures >= ABORT_AFTER_CONSECUTIVE_FAILURES:
+                remaining = len(props) - (i + 1)
+                print(
+                    f"ABORTING: {consecutive_failures} consecutive failures — "
+                    f"Redfin appears fully blocked. Skipping remaining {remaining} propert"
+                    f"{'y' if remaining == 1 else 'ies'} and the sales check this run."
+                )
+                aborted = True
+                break
+
+            backoff_level = _pace(i, len(props), consecutive_failures, backoff_level)
+        _collect(wait=True)
+
+    blocked = aborted or consecutive_failures >= ABORT_AFTER_CONSECUTIVE_FAILURES
+    return results, blocked
+
+
 # --- Main logic ---
 
 def load_properties():
     """Read properties.csv and return list of dicts with unit_number and redfin_url."""
     props = []
     with open(PROPERTIES_CSV, newline="") as f:
-        reader = csv.DictReader(f)
+        reader = csv.reader(f)
+        header = next(reader)
+        i_unit = header.index("unit_number")
+        i_address = header.index("address")
+        i_url = header.index("redfin_url")
         for row in reader:
-            url = row.get("redfin_url", "").strip()
+            url = row[i_url].strip() if len(row) > i_url else ""
             if url:
                 props.append({
-                    "unit": int(row["unit_number"]),
-                    "address": row["address"],
+                    "unit": int(row[i_unit]),
+                    "address": row[i_address],
                     "redfin_url": url,
                 })
     return props
 
 
 def load_data_json():
+    if orjson is not None:
+        with open(DATA_JSON, "rb") as f:
+            return orjson.loads(f.read())
     with open(DATA_JSON) as f:
         return json.load(f)
 
 
 def save_data_json(data):
+    if orjson is not None:
+        option = orjson.OPT_APPEND_NEWLINE
+        if EXPORT_PRETTY:
+            option |= orjson.OPT_INDENT_2
+        with open(DATA_JSON, "wb") as f:
+            f.write(orjson.dumps(data, option=option))
+        return
     with open(DATA_JSON, "w") as f:
-        json.dump(data, f, indent=2)
+        if EXPORT_PRETTY:
+            json.dump(data, f, indent=2)
+        else:
+            json.dump(data, f, separators=(",", ":"))
         f.write("\n")
 
 
@@ -375,47 +528,24 @@ def main():
     prop_map = {p["unit"]: p for p in data["properties"]}
 
     today = date.today().isoformat()
+    results, blocked = scrape_estimates(props)
+
     successes = 0
-    failures = 0
     api_successes = 0
     html_successes = 0
-
-    consecutive_failures = 0
-    backoff_level = 0
-    blocked = False
-    for i, prop in enumerate(props):
-        unit = prop["unit"]
-        print(f"[{i+1}/{len(props)}] Unit {unit}: {prop['redfin_url']}")
-
-        price, method = scrape_redfin(prop["redfin_url"])
-        if price:
-            print(f"  -> ${price:,.0f}")
-            if unit in prop_map:
-                prop_map[unit]["redfin"] = price
-                prop_map[unit]["estimate_date"] = today
-            successes += 1
-            consecutive_failures = 0
-            if method == "api":
-                api_successes += 1
-            else:
-                html_successes += 1
+    for unit, (price, method) in results.items():
+        if not price:
+            continue
+        if unit in prop_map:
+            prop_map[unit]["redfin"] = price
+            prop_map[unit]["estimate_date"] = today
+        successes += 1
+        if method == "api":
+            api_successes += 1
         else:
-            print("  -> FAILED")
-            failures += 1
-            consecutive_failures += 1
-
-        if consecutive_failures >= ABORT_AFTER_CONSECUTIVE_FAILURES:
-            remaining = len(props) - (i + 1)
-            print(
-                f"ABORTING: {consecutive_failures} consecutive failures — "
-                f"Redfin appears fully blocked. Skipping remaining {remaining} propert"
-                f"{'y' if remaining == 1 else 'ies'} and the sales check this run."
-            )
-            failures += remaining
-            blocked = True
-            break
-
-        backoff_level = _pace(i, len(props), consecutive_failures, backoff_level)
+            html_successes += 1
+    # Properties skipped after an abort count as failures too
+    failures = len(props) - successes
 
     # Check Redfin property pages for new sales not already in data.json
     # (skip if we already gave up above — Redfin is blocking us either way)
@@ -427,13 +557,13 @@ def main():
         if discovered:
             print(f"Found {len(discovered)} new sale(s) — adding to data.json")
             data["sales"] = data.get("sales", []) + discovered
-            data["sales"].sort(key=lambda s: (s["date"], s["unit"]))
+            data["sales"].sort(key=itemgetter("date", "unit"))
         else:
             print("No new sales detected.")
 
     # Compute stats for changelog
     redfin_vals = [p["redfin"] for p in prop_map.values() if p.get("redfin")]
-    avg_redfin = round(sum(redfin_vals) / len(redfin_vals)) if redfin_vals else 0
+    avg_redfin = round(fmean(redfin_vals)) if redfin_vals else 0
 
     changelog = data.get("changelog", [])
     current_sales_count = len(data.get("sales", []))
@@ -1,6 +1,8 @@
 import os
 import logging
 
+from urllib3.util.request import ACCEPT_ENCODING as _URLLIB3_ENCODINGS
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DB_PATH = os.path.join(DATA_DIR, "woodgate.db")
@@ -8,8 +10,17 @@ DB_URL = f"sqlite:///{DB_PATH}"
 PROPERTIES_CSV = os.path.join(BASE_DIR, "properties.csv")
 
 # Rate limiting
-MIN_DELAY = 1.0  # seconds between requests
+# scrape_sales_history / scrape_sqft: each of up to MAX_WORKERS concurrent
+# workers waits MIN-MAX_DELAY seconds before each of its requests
+MIN_DELAY = 1.0
 MAX_DELAY = 2.0
+MAX_WORKERS = 4  # concurrent Redfin requests in the bulk scrapers and scraper.py
+# scraper.py paces by host instead: seconds between the starts of consecutive
+# requests to a site, however many workers are running
+REDFIN_MIN_GAP = 1.0
+REDFIN_MAX_GAP = 2.0
+ZILLOW_MIN_GAP = 3.0
+ZILLOW_MAX_GAP = 6.0
 
 # Scraping schedule
 BATCH_SIZE = 5  # properties per daily run
@@ -24,6 +35,24 @@ USER_AGENTS = [
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
 ]
 
+# Chrome for scraper.py's Zillow browsers. Each concurrent browser keeps its own
+# persistent profile under CHROME_PROFILE_DIR, so cookies and the asset cache
+# survive between runs. Set CHROMEDRIVER_PATH / CHROME_VERSION_MAIN to pin the
+# driver rather than have undetected_chromedriver look one up on every start.
+CHROME_PROFILE_DIR = os.environ.get("CHROME_PROFILE_DIR", os.path.join(DATA_DIR, "chrome-profile"))
+CHROMEDRIVER_PATH = os.environ.get("CHROMEDRIVER_PATH") or None
+CHROME_VERSION_MAIN = int(os.environ["CHROME_VERSION_MAIN"]) if os.environ.get("CHROME_VERSION_MAIN") else None
+# Images and fonts aren't needed to read a price, so the browsers never fetch them
+CHROME_BLOCKED_URLS = ["*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg", "*.woff", "*.woff2", "*.ttf"]
+
+# data.json is written compact; set EXPORT_PRETTY=1 for indented, diffable output
+EXPORT_PRETTY = os.environ.get("EXPORT_PRETTY") == "1"
+
+# Compression to advertise: only what urllib3 can decode in this environment,
+# which includes "br" only when the brotli package is installed
+ACCEPT_ENCODING = _URLLIB3_ENCODINGS
+BROTLI_AVAILABLE = "br" in ACCEPT_ENCODING.split(",")
+
 # Logging
 LOG_LEVEL = logging.INFO
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
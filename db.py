@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import csv
 import logging
+from dataclasses import dataclass
 from datetime import datetime, timezone
 
 from sqlalchemy import (
@@ -9,9 +10,15 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
+    and_,
     create_engine,
+    event,
+    func,
+    insert,
+    select,
 )
 from sqlalchemy.orm import DeclarativeBase, Session, relationship, sessionmaker
 
@@ -72,13 +79,76 @@ class Sale(Base):
         return f"<Sale ${self.sale_price:,.0f} on {self.sale_date}>"
 
 
+class UrlSelector(Base):
+    """What the last successful scrape of a page used and got.
+
+    Lets the next run send a conditional GET and try the working selector first.
+    """
+    __tablename__ = "url_selectors"
+
+    url = Column(String, primary_key=True)
+    selector = Column(String)  # CSS selector, or "regex" for the page-text match
+    etag = Column(String)
+    last_modified = Column(String)
+    last_price = Column(Float)
+
+
+@dataclass(frozen=True)
+class PropertyRow:
+    """Plain, session-independent copy of the Property columns the scraper uses."""
+    id: int
+    unit_number: str | None
+    address: str
+    zillow_url: str | None
+    redfin_url: str | None
+
+
+@dataclass(frozen=True)
+class UrlSelectorRow:
+    """Plain, session-independent copy of a UrlSelector row."""
+    url: str
+    selector: str | None
+    etag: str | None
+    last_modified: str | None
+    last_price: float | None
+
+
+# Latest-estimate-per-(property, source) lookups seek straight to the newest row,
+# and the scheduler's max(captured_at) per property is a covering-index scan
+Index("ix_est_prop_src_cap", Estimate.property_id, Estimate.source, Estimate.captured_at.desc())
+# Joining sales to estimates walks sales by property and date
+Index("ix_sales_prop_date", Sale.property_id, Sale.sale_date)
+
+
 engine = create_engine(config.DB_URL, echo=False)
 SessionLocal = sessionmaker(bind=engine)
+# For read-only paths: nothing is written, so skip autoflush before each query
+# and keep loaded values usable after the session closes.
+ReadSession = sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",  # readers don't block the scraper's writes
+    "synchronous=NORMAL",  # fsync at checkpoints, not on every commit
+    "mmap_size=268435456",
+    "temp_store=MEMORY",
+    "cache_size=-65536",  # 64 MiB
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _):
+    cur = dbapi_conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cur.execute(f"PRAGMA {pragma}")
+    cur.close()
 
 
 def init_db():
-    """Create all tables."""
+    """Create all tables, plus any indexes missing from an existing database."""
     Base.metadata.create_all(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
     logger.info("Database initialized at %s", config.DB_PATH)
 
 
@@ -124,6 +194,21 @@ def add_estimate(session: Session, property_id: int, source: str, estimated_pric
     return estimate
 
 
+def add_estimates(session: Session, estimates: list[tuple[int, str, float]]) -> None:
+    """Insert (property_id, source, estimated_price) estimates in one transaction.
+
+    One commit for the lot, where add_estimate() commits (and syncs) per row.
+    """
+    if not estimates:
+        return
+    session.execute(insert(Estimate), [
+        {"property_id": property_id, "source": source, "estimated_price": price}
+        for property_id, source, price in estimates
+    ])
+    session.commit()
+    logger.info("Added %d estimates", len(estimates))
+
+
 def add_sale(session: Session, property_id: int, sale_price: float,
              sale_date: datetime, asking_price: float = None) -> Sale:
     sale = Sale(
@@ -142,6 +227,49 @@ def get_all_properties(session: Session) -> list[Property]:
     return session.query(Property).order_by(Property.unit_number).all()
 
 
+def get_scrape_targets(session: Session) -> list[PropertyRow]:
+    """Return every property with a Zillow or Redfin URL, by unit number."""
+    rows = session.execute(
+        select(
+            Property.id,
+            Property.unit_number,
+            Property.address,
+            Property.zillow_url,
+            Property.redfin_url,
+        )
+        .where(Property.zillow_url.isnot(None) | Property.redfin_url.isnot(None))
+        .order_by(Property.unit_number)
+    )
+    return [PropertyRow(*row) for row in rows]
+
+
+def get_url_selectors(session: Session, urls: list[str]) -> dict[str, UrlSelectorRow]:
+    """Return the stored UrlSelector rows for the given URLs, keyed by URL."""
+    rows = session.execute(
+        select(
+            UrlSelector.url,
+            UrlSelector.selector,
+            UrlSelector.etag,
+            UrlSelector.last_modified,
+            UrlSelector.last_price,
+        ).where(UrlSelector.url.in_(urls))
+    )
+    return {row.url: UrlSelectorRow(*row) for row in rows}
+
+
+def save_url_selectors(session: Session, rows: list[UrlSelectorRow]) -> None:
+    """Insert or update UrlSelector rows, all in one transaction."""
+    for row in rows:
+        session.merge(UrlSelector(
+            url=row.url,
+            selector=row.selector,
+            etag=row.etag,
+            last_modified=row.last_modified,
+            last_price=row.last_price,
+        ))
+    session.commit()
+
+
 def get_estimates_for_property(session: Session, property_id: int) -> list[Estimate]:
     return (
         session.query(Estimate)
@@ -152,56 +280,103 @@ def get_estimates_for_property(session: Session, property_id: int) -> list[Estim
 
 
 def get_sales_with_estimates(session: Session) -> list[dict]:
-    """Get all sales paired with the most recent estimate before each sale."""
+    """Get all sales paired with the most recent estimate before each sale.
+
+    Runs as a single query: estimates captured on or before each sale are
+    ranked per (sale, source) with a window function and only the latest
+    one is kept.
+    """
+    ranked = (
+        select(
+            Sale.id.label("sale_id"),
+            Estimate.source,
+            Estimate.estimated_price,
+            Estimate.captured_at,
+            func.row_number().over(
+                partition_by=(Sale.id, Estimate.source),
+                order_by=Estimate.captured_at.desc(),
+            ).label("rn"),
+        )
+        .join(Estimate, and_(
+            Estimate.property_id == Sale.property_id,
+            Estimate.captured_at <= Sale.sale_date,
+        ))
+        .where(Estimate.source.in_(("zillow", "redfin")))
+        .subquery()
+    )
+    stmt = (
+        select(
+            Sale.property_id,
+            Property.address,
+            ranked.c.source,
+            ranked.c.estimated_price,
+            Sale.sale_price,
+            Sale.sale_date,
+            ranked.c.captured_at,
+        )
+        .join(ranked, ranked.c.sale_id == Sale.id)
+        .join(Property, Property.id == Sale.property_id)
+        .where(ranked.c.rn == 1)
+        # "zillow" sorts after "redfin", so desc keeps zillow first per sale
+        .order_by(Sale.id, ranked.c.source.desc())
+    )
+
     results = []
-    sales = session.query(Sale).all()
-    for sale in sales:
-        for source in ("zillow", "redfin"):
-            estimate = (
-                session.query(Estimate)
-                .filter(
-                    Estimate.property_id == sale.property_id,
-                    Estimate.source == source,
-                    Estimate.captured_at <= sale.sale_date,
-                )
-                .order_by(Estimate.captured_at.desc())
-                .first()
-            )
-            if estimate:
-                error = estimate.estimated_price - sale.sale_price
-                pct_error = (error / sale.sale_price) * 100
-                results.append({
-                    "property_id": sale.property_id,
-                    "address": sale.property.address,
-                    "source": source,
-                    "estimated_price": estimate.estimated_price,
-                    "sale_price": sale.sale_price,
-                    "sale_date": sale.sale_date,
-                    "estimate_date": estimate.captured_at,
-                    "error": error,
-                    "pct_error": pct_error,
-                })
+    for row in session.execute(stmt):
+        error = row.estimated_price - row.sale_price
+        pct_error = (error / row.sale_price) * 100
+        results.append({
+            "property_id": row.property_id,
+            "address": row.address,
+            "source": row.source,
+            "estimated_price": row.estimated_price,
+            "sale_price": row.sale_price,
+            "sale_date": row.sale_date,
+            "estimate_date": row.captured_at,
+            "error": error,
+            "pct_error": pct_error,
+        })
     return results
 
 
 def seed_db(csv_path: str = None):
-    """Load properties from CSV into the database."""
+    """Load properties from CSV into the database.
+
+    New addresses are bulk-inserted and URL changes on existing ones applied
+    in the same transaction, so seeding costs one commit regardless of size.
+    """
     csv_path = csv_path or config.PROPERTIES_CSV
     session = get_session()
     count = 0
     try:
+        existing = {p.address: p for p in session.query(Property).all()}
+        new_rows = {}
         with open(csv_path, newline="") as f:
             reader = csv.DictReader(f)
             for row in reader:
-                get_or_create_property(
-                    session,
-                    address=row["address"].strip(),
-                    unit_number=row.get("unit_number", "").strip() or None,
-                    zillow_url=row.get("zillow_url", "").strip() or None,
-                    redfin_url=row.get("redfin_url", "").strip() or None,
-                )
+                address = row["address"].strip()
+                zillow_url = row.get("zillow_url", "").strip() or None
+                redfin_url = row.get("redfin_url", "").strip() or None
                 count += 1
-        logger.info("Seeded %d properties from %s", count, csv_path)
+
+                prop = existing.get(address)
+                if prop is not None:
+                    if zillow_url and prop.zillow_url != zillow_url:
+                        prop.zillow_url = zillow_url
+                    if redfin_url and prop.redfin_url != redfin_url:
+                        prop.redfin_url = redfin_url
+                elif address not in new_rows:
+                    new_rows[address] = {
+                        "address": address,
+                        "unit_number": row.get("unit_number", "").strip() or None,
+                        "zillow_url": zillow_url,
+                        "redfin_url": redfin_url,
+                    }
+
+        if new_rows:
+            session.bulk_insert_mappings(Property, list(new_rows.values()))
+        session.commit()
+        logger.info("Seeded %d properties from %s (%d new)", count, csv_path, len(new_rows))
     finally:
         session.close()
     return count
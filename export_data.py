@@ -1,15 +1,21 @@
 """Export Woodgate price data to JSON for the GitHub Pages dashboard."""
 from __future__ import annotations
 
-import csv
 import json
+import mmap
 import os
 from datetime import datetime, timezone
+from operator import itemgetter
 
-from sqlalchemy import desc
+from sqlalchemy import and_, func, select
 
 import config
-from db import Estimate, Property, SessionLocal
+from db import Estimate, Property, ReadSession
+
+try:
+    import orjson
+except ImportError:  # stdlib json gives the same result, just more slowly
+    orjson = None
 
 DOCS_DIR = os.path.join(config.BASE_DIR, "docs")
 OUTPUT_PATH = os.path.join(DOCS_DIR, "data.json")
@@ -19,22 +25,57 @@ TAX_HISTORY = os.path.join(config.BASE_DIR, "data", "tax_history.json")
 SQFT_PATH = os.path.join(config.BASE_DIR, "data", "sqft.json")
 
 
+def _load_json(path):
+    """Read a JSON file, with orjson when it is installed.
+
+    orjson parses straight out of a memory map of the file, so the contents
+    are never copied into an intermediate bytes object.
+    """
+    if orjson is not None:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return orjson.loads(b"")  # mmap can't map an empty file
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                return orjson.loads(view)
+    with open(path) as f:
+        return json.load(f)
+
+
+def _dump_json(path, data):
+    """Write data as JSON in a single write call, indented if EXPORT_PRETTY is set."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if config.EXPORT_PRETTY:
+            option |= orjson.OPT_INDENT_2
+        buf = orjson.dumps(data, option=option)
+    elif config.EXPORT_PRETTY:
+        buf = json.dumps(data, indent=2).encode()
+    else:
+        buf = json.dumps(data, separators=(",", ":")).encode()
+    with open(path, "wb") as f:
+        f.write(buf)
+
+
 def load_hoa_sales():
-    """Parse hoa_sales.csv and return SALE records with source tag."""
+    """Parse hoa_sales.csv and return SALE records with source tag.
+
+    Only the first four fields of a SALE row are needed and they never
+    contain commas, so lines are filtered and split as bytes rather than
+    going through csv.reader.
+    """
     sales = []
-    with open(SALES_CSV, newline="") as f:
-        reader = csv.reader(f)
-        for row in reader:
-            if row[0].strip('"') != "SALE":
+    with open(SALES_CSV, "rb") as f:
+        for line in f:
+            if not line.startswith(b'"SALE"'):
                 continue
-            unit = int(row[1].strip('"'))
-            date_str = row[2].strip('"')
-            price = int(row[3].strip('"'))
+            fields = line.split(b",", 4)
+            date_str = fields[2].strip(b'"').decode()
             sales.append({
-                "unit": unit,
+                "unit": int(fields[1].strip(b'"')),
                 "date": date_str,
-                "price": price,
+                "price": int(fields[3].strip(b'"')),
                 "source": "hoa",
+                "_date": _parse_date(date_str),
             })
     return sales
 
@@ -43,24 +84,33 @@ def load_redfin_sales():
     """Load scraped Redfin sales history."""
     if not os.path.exists(SCRAPED_SALES):
         return []
-    with open(SCRAPED_SALES) as f:
-        data = json.load(f)
-    redfin = data.get("redfin", {})
-    sales = []
-    for unit_str, records in redfin.items():
-        unit = int(unit_str)
-        for rec in records:
-            sales.append({
-                "unit": unit,
-                "date": rec["date"],
-                "price": rec["price"],
-                "source": "redfin",
-            })
-    return sales
+    data = _load_json(SCRAPED_SALES)
+    return [
+        {
+            "unit": int(unit_str),
+            "date": rec["date"],
+            "price": rec["price"],
+            "source": "redfin",
+            "_date": _parse_date(rec["date"]),
+        }
+        for unit_str, records in data.get("redfin", {}).items()
+        for rec in records
+    ]
+
+
+def _parse_date(date_str):
+    """Parse a YYYY-MM-DD string to a date, or None if it isn't one."""
+    try:
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        return None
 
 
 def is_duplicate(a, b, max_days=90):
-    """Check if two sales records for the same unit are likely the same sale."""
+    """Check if two sales records for the same unit are likely the same sale.
+
+    Uses the "_date" field the loaders parse once per record.
+    """
     if a["unit"] != b["unit"]:
         return False
     # Exact duplicate
@@ -71,77 +121,108 @@ def is_duplicate(a, b, max_days=90):
     pct_diff = price_diff / max(a["price"], 1) * 100
     if price_diff > 1000 and pct_diff > 1.0:
         return False
-    try:
-        da = datetime.strptime(a["date"], "%Y-%m-%d")
-        db = datetime.strptime(b["date"], "%Y-%m-%d")
-        return abs((da - db).days) <= max_days
-    except ValueError:
+    if a["_date"] is None or b["_date"] is None:
         return False
+    return abs((a["_date"] - b["_date"]).days) <= max_days
 
 
 def merge_sales(hoa_sales, redfin_sales):
-    """Merge HOA and Redfin sales, deduplicating. HOA records take priority."""
+    """Merge HOA and Redfin sales, deduplicating. HOA records take priority.
+
+    Records are bucketed by unit, so each Redfin sale is only compared
+    against already-merged sales for the same unit.
+    """
     # Start with all HOA records
     merged = list(hoa_sales)
+    by_unit = {}
+    for sale in hoa_sales:
+        by_unit.setdefault(sale["unit"], []).append(sale)
 
     # Add Redfin records that aren't duplicates of existing entries
     for r_sale in redfin_sales:
-        is_dup = any(is_duplicate(r_sale, existing) for existing in merged)
-        if not is_dup:
+        bucket = by_unit.setdefault(r_sale["unit"], [])
+        if not any(is_duplicate(r_sale, existing) for existing in bucket):
             merged.append(r_sale)
+            bucket.append(r_sale)
 
-    merged.sort(key=lambda s: (s["date"], s["unit"]))
+    merged.sort(key=itemgetter("date", "unit"))
     return merged
 
 
 def export_estimates():
-    """Query DB for the latest Zillow and Redfin estimate per property."""
-    session = SessionLocal()
-    properties = []
+    """Query DB for the latest Zillow and Redfin estimate per property.
+
+    One statement: estimates are ranked per (property, source) with a window
+    function and the newest of each is outer-joined onto the property list.
+    """
+    ranked = (
+        select(
+            Estimate.property_id,
+            Estimate.source,
+            Estimate.estimated_price,
+            Estimate.captured_at,
+            func.row_number().over(
+                partition_by=(Estimate.property_id, Estimate.source),
+                order_by=Estimate.captured_at.desc(),
+            ).label("rn"),
+        )
+        .where(Estimate.source.in_(("zillow", "redfin")))
+        .subquery()
+    )
+    stmt = (
+        select(
+            Property.id,
+            Property.unit_number,
+            Property.address,
+            ranked.c.source,
+            ranked.c.estimated_price,
+            ranked.c.captured_at,
+        )
+        .outerjoin(ranked, and_(ranked.c.property_id == Property.id, ranked.c.rn == 1))
+        .order_by(Property.unit_number, Property.id)
+        # Stream rows in batches rather than buffering the whole result
+        .execution_options(yield_per=500)
+    )
+
+    session = ReadSession()
+    entries = {}
     try:
-        for prop in session.query(Property).order_by(Property.unit_number).all():
-            entry = {
-                "unit": int(prop.unit_number),
-                "address": prop.address,
-                "zillow": None,
-                "redfin": None,
-                "estimate_date": None,
-                "zillow_date": None,
-            }
-            for source in ("zillow", "redfin"):
-                est = (
-                    session.query(Estimate)
-                    .filter_by(property_id=prop.id, source=source)
-                    .order_by(desc(Estimate.captured_at))
-                    .first()
-                )
-                if est:
-                    entry[source] = int(est.estimated_price)
-                    est_date = est.captured_at.strftime("%Y-%m-%d")
-                    if source == "zillow":
-                        entry["zillow_date"] = est_date
-                    if entry["estimate_date"] is None or est_date > entry["estimate_date"]:
-                        entry["estimate_date"] = est_date
-            properties.append(entry)
+        for row in session.execute(stmt):
+            entry = entries.get(row.id)
+            if entry is None:
+                entry = entries[row.id] = {
+                    "unit": int(row.unit_number),
+                    "address": row.address,
+                    "zillow": None,
+                    "redfin": None,
+                    "estimate_date": None,
+                    "zillow_date": None,
+                }
+            if row.source is None:
+                continue
+            entry[row.source] = int(row.estimated_price)
+            est_date = row.captured_at.strftime("%Y-%m-%d")
+            if row.source == "zillow":
+                entry["zillow_date"] = est_date
+            if entry["estimate_date"] is None or est_date > entry["estimate_date"]:
+                entry["estimate_date"] = est_date
     finally:
         session.close()
-    return properties
+    return list(entries.values())
 
 
 def load_tax_history():
     """Load scraped tax history data."""
     if not os.path.exists(TAX_HISTORY):
         return {}
-    with open(TAX_HISTORY) as f:
-        return json.load(f)
+    return _load_json(TAX_HISTORY)
 
 
 def load_sqft():
     """Load scraped square footage data."""
     if not os.path.exists(SQFT_PATH):
         return {}
-    with open(SQFT_PATH) as f:
-        return json.load(f)
+    return _load_json(SQFT_PATH)
 
 
 def main():
@@ -154,22 +235,25 @@ def main():
     sqft = load_sqft()
 
     properties = export_estimates()
-    # Merge sqft into property records
-    for prop in properties:
-        unit_key = str(prop["unit"])
-        prop["sqft"] = sqft.get(unit_key)
+    sqft_by_unit = {int(unit): value for unit, value in sqft.items()}
+
+    # Most recent sale per unit, in one pass (earliest record wins a date tie)
+    latest_by_unit = {}
+    for sale in merged:
+        latest = latest_by_unit.get(sale["unit"])
+        if latest is None or sale["date"] > latest["date"]:
+            latest_by_unit[sale["unit"]] = sale
 
-    # Detect units needing Zillow data collection: units with a sale
-    # more recent than their latest Zillow estimate.
+    # Merge sqft into property records, and detect units needing Zillow data
+    # collection: units with a sale more recent than their latest Zillow estimate.
     zillow_alerts = []
     for prop in properties:
         unit = prop["unit"]
+        prop["sqft"] = sqft_by_unit.get(unit)
         zillow_date = prop.get("zillow_date")
-        # Find the most recent sale for this unit
-        unit_sales = [s for s in merged if s["unit"] == unit]
-        if not unit_sales:
+        latest_sale = latest_by_unit.get(unit)
+        if latest_sale is None:
             continue
-        latest_sale = max(unit_sales, key=lambda s: s["date"])
         if not zillow_date or latest_sale["date"] > zillow_date:
             zillow_alerts.append({
                 "unit": unit,
@@ -181,8 +265,7 @@ def main():
     # Preserve existing changelog from data.json (maintained by ci_update_redfin.py)
     existing_changelog = []
     if os.path.exists(OUTPUT_PATH):
-        with open(OUTPUT_PATH) as f:
-            existing_changelog = json.load(f).get("changelog", [])
+        existing_changelog = _load_json(OUTPUT_PATH).get("changelog", [])
 
     data = {
         "exported_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
@@ -193,11 +276,14 @@ def main():
         "changelog": existing_changelog,
     }
 
-    with open(OUTPUT_PATH, "w") as f:
-        json.dump(data, f, indent=2)
+    # The parsed dates were only needed for deduplication
+    for sale in merged:
+        del sale["_date"]
+    _dump_json(OUTPUT_PATH, data)
 
-    hoa_count = sum(1 for s in merged if s["source"] == "hoa")
-    redfin_count = sum(1 for s in merged if s["source"] == "redfin")
+    # merge_sales keeps every HOA record, so the rest came from Redfin
+    hoa_count = len(hoa_sales)
+    redfin_count = len(merged) - hoa_count
     print(f"Exported {len(data['properties'])} properties, "
           f"{len(merged)} sales ({hoa_count} HOA + {redfin_count} Redfin) "
           f"to {OUTPUT_PATH}")
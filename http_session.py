@@ -0,0 +1,46 @@
+"""HTTP plumbing shared by the scrapers: a pooled session and User-Agent rotation."""
+from __future__ import annotations
+
+import itertools
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+
+
+def make_session() -> requests.Session:
+    """Return a Session with the fixed browser headers, pooling and retries.
+
+    Use one per run so requests to a host reuse the same TCP/TLS connections
+    instead of handshaking every time. Only the User-Agent is left to be set
+    per request.
+    """
+    session = requests.Session()
+    session.headers.update({
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "en-US,en;q=0.9",
+        "Accept-Encoding": config.ACCEPT_ENCODING,
+        "Connection": "keep-alive",
+    })
+    session.mount("https://", HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=16,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+    ))
+    return session
+
+
+# Shuffled once, then handed out in turn so concurrent workers spread evenly
+# over the pool instead of colliding on the same User-Agent
+_UA_CYCLE = itertools.cycle(random.sample(config.USER_AGENTS, len(config.USER_AGENTS)))
+_UA_LOCK = threading.Lock()
+
+
+def next_user_agent() -> str:
+    """The next User-Agent in the rotation; safe to call from any thread."""
+    with _UA_LOCK:
+        return next(_UA_CYCLE)
@@ -5,11 +5,15 @@ import argparse
 import sys
 from datetime import datetime
 
+from sqlalchemy import func, select
+
 import config  # noqa: F401 — triggers logging setup
 from db import (
     Property,
+    ReadSession,
     add_sale,
     get_all_properties,
+    get_scrape_targets,
     get_session,
     init_db,
     seed_db,
@@ -38,30 +42,32 @@ def cmd_scrape(args):
     """Run the scraper on a batch of properties."""
     from scraper import scrape_batch
 
-    session = get_session()
-    try:
-        if args.all:
-            properties = [p for p in get_all_properties(session) if p.zillow_url or p.redfin_url]
-        else:
-            from scheduler import get_next_batch
-            properties = get_next_batch(args.batch)
+    # Both paths return plain PropertyRow values, so no session is held open
+    # while the (slow) scrape runs.
+    if args.all:
+        session = ReadSession()
+        try:
+            properties = get_scrape_targets(session)
+        finally:
+            session.close()
+    else:
+        from scheduler import get_next_batch
+        properties = get_next_batch(args.batch)
 
-        if not properties:
-            print("No properties with URLs configured. Edit properties.csv and run 'init'.")
-            return
+    if not properties:
+        print("No properties with URLs configured. Edit properties.csv and run 'init'.")
+        return
 
-        print(f"Scraping {len(properties)} properties...")
-        results = scrape_batch(properties)
+    print(f"Scraping {len(properties)} properties...")
+    results = scrape_batch(properties)
 
-        successes = sum(1 for r in results if r.success)
-        failures = sum(1 for r in results if not r.success)
-        print(f"\nDone: {successes} estimates collected, {failures} failures")
+    successes = sum(1 for r in results if r.success)
+    failures = sum(1 for r in results if not r.success)
+    print(f"\nDone: {successes} estimates collected, {failures} failures")
 
-        for r in results:
-            status = f"${r.price:,.0f}" if r.success else f"FAILED: {r.error_msg}"
-            print(f"  Property {r.property_id} ({r.source}): {status}")
-    finally:
-        session.close()
+    for r in results:
+        status = f"${r.price:,.0f}" if r.success else f"FAILED: {r.error_msg}"
+        print(f"  Property {r.property_id} ({r.source}): {status}")
 
 
 def cmd_add_sale(args):
@@ -112,21 +118,25 @@ def cmd_schedule(args):
 
 def cmd_status(args):
     """Show current database status."""
-    session = get_session()
+    session = ReadSession()
     try:
         from db import Estimate, Sale
-        props = get_all_properties(session)
-        estimates = session.query(Estimate).count()
-        sales = session.query(Sale).count()
-        with_urls = sum(1 for p in props if p.zillow_url or p.redfin_url)
-
-        print(f"Properties:  {len(props)} ({with_urls} with URLs)")
+        props = session.scalar(select(func.count()).select_from(Property))
+        with_urls = session.scalar(
+            select(func.count())
+            .select_from(Property)
+            .where(Property.zillow_url.isnot(None) | Property.redfin_url.isnot(None))
+        )
+        estimates = session.scalar(select(func.count()).select_from(Estimate))
+        sales = session.scalar(select(func.count()).select_from(Sale))
+
+        print(f"Properties:  {props} ({with_urls} with URLs)")
         print(f"Estimates:   {estimates}")
         print(f"Sales:       {sales}")
 
         if estimates > 0:
-            latest = session.query(Estimate).order_by(Estimate.captured_at.desc()).first()
-            print(f"Last scrape: {latest.captured_at}")
+            latest = session.scalar(select(func.max(Estimate.captured_at)))
+            print(f"Last scrape: {latest}")
     finally:
         session.close()
 
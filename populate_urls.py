@@ -4,6 +4,7 @@
 from __future__ import annotations
 
 import csv
+import functools
 import logging
 import random
 import re
@@ -16,14 +17,18 @@ import config
 logging.basicConfig(level=logging.INFO, format=config.LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
+_WS_RE = re.compile(r"\s+")
 
+
+@functools.lru_cache(maxsize=4096)
 def build_zillow_url(address: str) -> str:
     """Construct a Zillow URL from an address."""
     # "111 Woodgate Ln Paoli PA 19301" -> "111-Woodgate-Ln-Paoli-PA-19301"
-    slug = address.replace(",", "").replace("  ", " ").strip().replace(" ", "-")
+    slug = _WS_RE.sub("-", address.replace(",", "").strip())
     return f"https://www.zillow.com/homes/{slug}_rb/"
 
 
+@functools.lru_cache(maxsize=4096)
 def build_redfin_url(address: str) -> str:
     """Construct a Redfin URL from an address.
 
@@ -31,13 +36,8 @@ def build_redfin_url(address: str) -> str:
     Without the home ID, Redfin may still resolve the address slug.
     """
     # "111 Woodgate Ln Paoli PA 19301" -> parts
-    parts = address.replace(",", "").split()
-    # Extract state, city, zip
     # Assumes format: "NUM Street St City ST ZIP"
-    zip_code = parts[-1]
-    state = parts[-2]
-    city = parts[-3]
-    street_parts = parts[:-3]  # everything before city
+    *street_parts, city, state, zip_code = address.replace(",", "").split()
     street_slug = "-".join(street_parts)
     return f"https://www.redfin.com/{state}/{city}/{street_slug}-{zip_code}/home/"
 
@@ -51,22 +51,21 @@ def main():
         rows = list(reader)
 
     total = len(rows)
-    zillow_count = 0
-    redfin_count = 0
-
-    for i, row in enumerate(rows):
-        address = row["address"]
-        logger.info("[%d/%d] Processing %s", i + 1, total, address)
-
-        # Zillow — deterministic URL pattern
-        if not row.get("zillow_url"):
-            row["zillow_url"] = build_zillow_url(address)
-            zillow_count += 1
-
-        # Redfin — deterministic URL pattern
-        if not row.get("redfin_url"):
-            row["redfin_url"] = build_redfin_url(address)
-            redfin_count += 1
+    zillow_count = sum(1 for row in rows if not row.get("zillow_url"))
+    redfin_count = sum(1 for row in rows if not row.get("redfin_url"))
+
+    # Both URL patterns are deterministic, so fill in whatever is missing
+    rows = [
+        {
+            **row,
+            "zillow_url": row.get("zillow_url") or build_zillow_url(row["address"]),
+            "redfin_url": row.get("redfin_url") or build_redfin_url(row["address"]),
+        }
+        for row in rows
+    ]
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, row in enumerate(rows):
+            logger.debug("[%d/%d] Processed %s", i + 1, total, row["address"])
 
     # Write updated CSV
     with open(config.PROPERTIES_CSV, "w", newline="") as f:
@@ -1,19 +1,23 @@
 import logging
 
 from apscheduler.schedulers.blocking import BlockingScheduler
-from sqlalchemy import func
+from sqlalchemy import func, select
 
 import config
-from db import Estimate, Property, SessionLocal, get_all_properties
+from db import Estimate, Property, PropertyRow, ReadSession
 from scraper import scrape_batch
 
 logger = logging.getLogger(__name__)
 
 
-def get_next_batch(batch_size: int = None) -> list[Property]:
-    """Select the next batch of properties to scrape, prioritizing those least recently scraped."""
+def get_next_batch(batch_size: int = None) -> list[PropertyRow]:
+    """Select the next batch of properties to scrape, prioritizing those least recently scraped.
+
+    Returns plain PropertyRow values rather than ORM objects, so callers can
+    use them after the session here is closed.
+    """
     batch_size = batch_size or config.BATCH_SIZE
-    session = SessionLocal()
+    session = ReadSession()
 
     try:
         # Subquery: most recent estimate date per property
@@ -27,17 +31,23 @@ def get_next_batch(batch_size: int = None) -> list[Property]:
         )
 
         # Get properties ordered by last scraped (nulls first = never scraped)
-        properties = (
-            session.query(Property)
+        rows = session.execute(
+            select(
+                Property.id,
+                Property.unit_number,
+                Property.address,
+                Property.zillow_url,
+                Property.redfin_url,
+            )
             .outerjoin(latest_estimate, Property.id == latest_estimate.c.property_id)
-            .filter(
+            .where(
                 # Only include properties that have at least one URL configured
                 (Property.zillow_url.isnot(None)) | (Property.redfin_url.isnot(None))
             )
             .order_by(latest_estimate.c.last_scraped.asc().nullsfirst())
             .limit(batch_size)
-            .all()
         )
+        properties = [PropertyRow(*row) for row in rows]
 
         logger.info("Selected %d properties for next batch", len(properties))
         return properties
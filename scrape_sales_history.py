@@ -5,25 +5,58 @@ Compares results against existing hoa_sales.csv records.
 from __future__ import annotations
 
 import csv
+import functools
+import gzip
 import json
 import logging
 import os
 import random
 import re
+import threading
 import time
-from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from operator import itemgetter
 
 import requests
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 
 import config
+from http_session import make_session, next_user_agent
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 RESULTS_PATH = os.path.join(config.BASE_DIR, "data", "scraped_sales_history.json")
+# Append-only log of per-unit results, folded into RESULTS_PATH once scraping ends
+RESULTS_JOURNAL = os.path.join(config.BASE_DIR, "data", "scraped_sales_history.jsonl")
 REPORT_PATH = os.path.join(config.BASE_DIR, "data", "sales_comparison_report.txt")
 HOA_CSV = os.path.join(config.BASE_DIR, "hoa_sales.csv")
+# Fetched pages, gzipped per source and unit, so re-runs can skip the network
+PAGE_CACHE_DIR = os.path.join(config.BASE_DIR, "data", "cache")
+PAGE_CACHE_TTL = 7 * 24 * 3600  # seconds before a cached page is fetched again
+
+# Patterns used on every row/page, compiled once at import
+_DIGITS_RE = re.compile(r"(\d+)")
+_REDFIN_DATE_RE = re.compile(r"([A-Za-z]{3})\s+(\d{1,2}),\s+(\d{4})")  # "Dec 23, 2020"
+_ISO_DATE_RE = re.compile(r"([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})")  # "2020-12-23"
+_US_DATE_RE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")  # "12/23/2020"
+_REDFIN_STATE_RE = re.compile(
+    r"root\.__reactServerState\.InitialContext\s*=\s*(\{.+?\});\s*root\.__reactServerState\.Config",
+    re.DOTALL,
+)
+_NEXT_DATA_RE = re.compile(r'<script id="__NEXT_DATA__"[^>]*>(.+?)</script>', re.DOTALL)
+_ZILLOW_SOLD_RE = re.compile(r"(\d{1,2}/\d{1,2}/\d{4})\s+Sold\s+\$([0-9,]+)", re.IGNORECASE)
+_MONTHS = {
+    name: i
+    for i, name in enumerate(
+        ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1
+    )
+}
+
+# Shared by Redfin and Zillow's plain-HTTP fetches for the whole run
+SESSION = make_session()
 
 
 def load_properties():
@@ -43,30 +76,28 @@ def load_properties():
 
 def load_hoa_sales():
     """Load existing hoa_sales.csv. Returns dict: unit -> list of (date, price)."""
-    sales = {}
-    with open(HOA_CSV, newline="") as f:
-        reader = csv.reader(f)
-        for row in reader:
-            rec_type = row[0].strip('"')
-            if rec_type != "SALE":
-                continue
-            unit = int(row[1].strip('"'))
-            date_str = row[2].strip('"')
-            price = int(row[3].strip('"'))
-            sales.setdefault(unit, []).append({"date": date_str, "price": price})
-    for unit in sales:
-        sales[unit].sort(key=lambda s: s["date"])
-    return sales
+    import pandas as pd  # only this loader needs it; keep script startup light
+
+    df = pd.read_csv(
+        HOA_CSV,
+        header=None,
+        usecols=[0, 1, 2, 3],
+        names=["type", "unit", "date", "price"],
+        dtype=str,
+        keep_default_na=False,
+    )
+    df = df[df["type"] == "SALE"].astype({"unit": int, "price": int})
+    # Stable sort so same-day sales keep their file order, as list.sort did
+    df = df.sort_values("date", kind="stable")
+    return {
+        int(unit): group[["date", "price"]].to_dict("records")
+        for unit, group in df.groupby("unit", sort=False)
+    }
 
 
 def get_headers():
-    return {
-        "User-Agent": random.choice(config.USER_AGENTS),
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Connection": "keep-alive",
-    }
+    """Per-request headers; the fixed ones are already set on SESSION."""
+    return {"User-Agent": next_user_agent()}
 
 
 def parse_price(text):
@@ -74,56 +105,156 @@ def parse_price(text):
     if not text or text.strip() in ("", "—", "-"):
         return None
     cleaned = text.strip().replace(",", "").replace("$", "")
-    match = re.search(r"(\d+)", cleaned)
+    match = _DIGITS_RE.search(cleaned)
     return int(match.group(1)) if match else None
 
 
 def parse_date_redfin(text):
-    """Parse Redfin date like 'Dec 23, 2020' to 'YYYY-MM-DD'."""
+    """Parse Redfin date like 'Dec 23, 2020' to 'YYYY-MM-DD'.
+
+    Hand-parsed rather than strptime("%b %d, %Y"), which is slow and
+    locale-dependent for what is always an English month abbreviation.
+    """
+    match = _REDFIN_DATE_RE.fullmatch(text.strip())
+    if not match:
+        return None
+    month = _MONTHS.get(match.group(1).lower())
+    if month is None:
+        return None
     try:
-        dt = datetime.strptime(text.strip(), "%b %d, %Y")
-        return dt.strftime("%Y-%m-%d")
+        return date(int(match.group(3)), month, int(match.group(2))).isoformat()
     except ValueError:
         return None
 
 
-def scrape_redfin_sales(url):
-    """Scrape sale history from a Redfin property page."""
+def parse_date_us(text):
+    """Parse a date like '12/23/2020' to 'YYYY-MM-DD'; raises ValueError if invalid."""
+    match = _US_DATE_RE.fullmatch(text)
+    if not match:
+        raise ValueError(f"not an M/D/YYYY date: {text!r}")
+    month, day, year = match.groups()
+    return date(int(year), int(month), int(day)).isoformat()
+
+
+def _find_key(obj, key):
+    """Depth-first search of decoded JSON for the first value stored under key.
+
+    Redfin nests API responses in the page state as strings prefixed with
+    "{}&&", so those are decoded and searched too.
+    """
+    if isinstance(obj, dict):
+        if key in obj:
+            return obj[key]
+        children = obj.values()
+    elif isinstance(obj, list):
+        children = obj
+    elif isinstance(obj, str) and obj.startswith("{}&&"):
+        try:
+            return _find_key(json.loads(obj[4:]), key)
+        except ValueError:
+            return None
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _redfin_sales_from_state(html):
+    """Sold events from the page's embedded __reactServerState JSON, or None."""
+    match = _REDFIN_STATE_RE.search(html)
+    if not match:
+        return None
     try:
-        resp = requests.get(url, headers=get_headers(), timeout=15)
-        resp.raise_for_status()
-    except requests.RequestException as e:
-        logger.error("Failed to fetch %s: %s", url, e)
+        history = _find_key(json.loads(match.group(1)), "propertyHistoryInfo")
+        events = history["events"]
+        sales = []
+        for event in events:
+            if not str(event.get("eventDescription", "")).startswith("Sold"):
+                continue
+            price = event.get("price")
+            millis = event.get("eventDate")
+            if not (price and millis):
+                continue
+            sold_on = datetime.fromtimestamp(millis / 1000, tz=timezone.utc).date()
+            sales.append({"date": sold_on.isoformat(), "price": int(price)})
+        return sales
+    except (ValueError, KeyError, TypeError, AttributeError, OverflowError, OSError):
+        return None
+
+
+def _page_cache_path(source, unit):
+    return os.path.join(PAGE_CACHE_DIR, source, f"{unit}.html.gz")
+
+
+def read_cached_page(source, unit):
+    """Cached page for a unit, or None if there isn't one younger than PAGE_CACHE_TTL."""
+    path = _page_cache_path(source, unit)
+    try:
+        if time.time() - os.path.getmtime(path) > PAGE_CACHE_TTL:
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+    except (OSError, EOFError):
         return None
 
-    soup = BeautifulSoup(resp.text, "lxml")
-    panel = soup.select_one(".sale-history-panel")
+
+def cache_page(source, unit, html):
+    """Store a fetched page under data/cache/<source>/<unit>.html.gz."""
+    path = _page_cache_path(source, unit)
+    # Write to a temp file and rename, so an interrupted run never leaves a
+    # truncated page behind to be read as fresh next time
+    tmp_path = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(html.encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not cache %s page for unit %s: %s", source, unit, e)
+
+
+def parse_redfin_sales(html, url):
+    """Sale history from the HTML of a Redfin property page."""
+    # Prefer the structured history in the page state; the DOM scrape below
+    # is the fallback for pages without it
+    sales = _redfin_sales_from_state(html)
+    if sales is not None:
+        return sales
+
+    tree = LexborHTMLParser(html)
+    panel = tree.css_first(".sale-history-panel")
     if not panel:
         logger.warning("No sale history panel found: %s", url)
         return []
 
     sales = []
-    rows = panel.select(".BasicTable__row")
+    rows = panel.css(".BasicTable__row")
     for row in rows:
-        date_el = row.select_one(".date")
-        event_el = row.select_one(".event")
-        price_el = row.select_one(".price")
+        date_el = row.css_first(".date")
+        event_el = row.css_first(".event")
+        price_el = row.css_first(".price")
         if not (date_el and event_el):
             continue
 
-        event = event_el.get_text(strip=True)
+        event = event_el.text(strip=True)
         if event != "Sold":
             continue
 
-        date_str = parse_date_redfin(date_el.get_text(strip=True))
+        date_str = parse_date_redfin(date_el.text(strip=True))
         if not date_str:
             continue
 
         # Remove sq ft subtext before parsing price
         if price_el:
-            for sub in price_el.select(".subtext"):
+            for sub in price_el.css(".subtext"):
                 sub.decompose()
-            price = parse_price(price_el.get_text(strip=True))
+            price = parse_price(price_el.text(strip=True))
         else:
             price = None
 
@@ -133,40 +264,173 @@ def scrape_redfin_sales(url):
     return sales
 
 
-def scrape_all_redfin(properties):
-    """Scrape Redfin sales history for all properties."""
-    results = {}
-    for i, prop in enumerate(properties):
-        unit = prop["unit"]
-        url = prop["redfin_url"]
-        logger.info("Redfin %d/%d: Unit %d", i + 1, len(properties), unit)
+def scrape_redfin_sales(url, unit=None):
+    """Scrape sale history from a Redfin property page.
 
-        sales = scrape_redfin_sales(url)
-        if sales is not None:
-            results[unit] = sales
-            logger.info("  Found %d sales", len(sales))
-        else:
-            results[unit] = []
-            logger.warning("  Failed to scrape")
+    If unit is given, the fetched page is also saved to the page cache.
+    """
+    try:
+        resp = SESSION.get(url, headers=get_headers(), timeout=15)
+        resp.raise_for_status()
+    except requests.RequestException as e:
+        logger.error("Failed to fetch %s: %s", url, e)
+        return None
+
+    if unit is not None:
+        cache_page("redfin", unit, resp.text)
+    return parse_redfin_sales(resp.text, url)
+
+
+def _scrape_redfin_sales_politely(prop, refetch=False):
+    """Redfin sales for one property, run on a worker thread.
+
+    A cached page is parsed straight away; otherwise the page is fetched
+    after a random 1-2s pause.
+    """
+    url, unit = prop["redfin_url"], prop["unit"]
+    if not refetch:
+        html = read_cached_page("redfin", unit)
+        if html is not None:
+            return parse_redfin_sales(html, url)
+    time.sleep(random.uniform(1.0, 2.0))
+    return scrape_redfin_sales(url, unit)
 
-        if i < len(properties) - 1:
-            time.sleep(random.uniform(1.0, 2.0))
+
+_JOURNAL_LOCK = threading.Lock()  # the Redfin and Zillow stages share one journal
+
+
+def _journal(journal, source, unit, sales):
+    """Append one unit's results to the open journal file, if there is one."""
+    if journal is not None:
+        line = json.dumps({"source": source, "unit": unit, "sales": sales}) + "\n"
+        with _JOURNAL_LOCK:
+            journal.write(line)
+            journal.flush()
+
+
+def scrape_all_redfin(properties, journal=None, refetch=False):
+    """Scrape Redfin sales history for all properties.
+
+    Up to config.MAX_WORKERS pages are fetched at once, each after its own
+    short random pause. Pages cached within PAGE_CACHE_TTL are reused
+    unless refetch is set. Results are logged in property order.
+    """
+    results = {}
+    scrape = functools.partial(_scrape_redfin_sales_politely, refetch=refetch)
+    with ThreadPoolExecutor(max_workers=config.MAX_WORKERS) as pool:
+        for i, (prop, sales) in enumerate(zip(properties, pool.map(scrape, properties))):
+            unit = prop["unit"]
+            logger.info("Redfin %d/%d: Unit %d", i + 1, len(properties), unit)
+            if sales is not None:
+                results[unit] = sales
+                logger.info("  Found %d sales", len(sales))
+            else:
+                results[unit] = []
+                logger.warning("  Failed to scrape")
+            _journal(journal, "redfin", unit, results[unit])
 
     return results
 
 
-def scrape_zillow_sales(url, driver):
-    """Scrape sale history from a Zillow property page using Selenium."""
+def _zillow_price_history(html):
+    """The priceHistory list from a Zillow page's __NEXT_DATA__ JSON, or None."""
+    match = _NEXT_DATA_RE.search(html)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(1))
+        cache = data["props"]["pageProps"]["componentProps"]["gdpClientCache"]
+        if isinstance(cache, str):  # the cache is itself JSON-encoded
+            cache = json.loads(cache)
+        for entry in cache.values():
+            history = (entry.get("property") or {}).get("priceHistory")
+            if history is not None:
+                return history
+    except (ValueError, KeyError, TypeError, AttributeError):
+        pass
+    return None
+
+
+def _sales_from_zillow_history(history):
+    """Sold events from a Zillow priceHistory list."""
+    sales = []
+    for event in history:
+        if "sold" not in str(event.get("event", "")).lower():
+            continue
+        date_str = event.get("date")
+        price = event.get("price")
+        if date_str and price and _date_ordinal(date_str) is not None:
+            sales.append({"date": date_str, "price": int(price)})
+    return sales
+
+
+def fetch_zillow_sales(url, unit=None):
+    """Scrape sale history from a Zillow property page over plain HTTP.
+
+    Reads the price history Zillow embeds as JSON, so no browser is needed.
+    Returns None if the page was blocked or didn't carry that data. If unit
+    is given, a usable page is also saved to the page cache.
+    """
+    headers = {**get_headers(), "Referer": "https://www.zillow.com/"}
+    try:
+        resp = SESSION.get(url, headers=headers, timeout=20)
+    except requests.RequestException as e:
+        logger.warning("Zillow HTTP fetch failed for %s: %s", url, e)
+        return None
+    if resp.status_code != 200 or "Access to this page has been denied" in resp.text:
+        return None
+
+    history = _zillow_price_history(resp.text)
+    if history is None:
+        return None
+
+    if unit is not None:
+        cache_page("zillow", unit, resp.text)
+    return _sales_from_zillow_history(history)
+
+
+def _find_parent(node, tag):
+    """Nearest ancestor of node with the given tag name, or None."""
+    node = node.parent
+    while node is not None:
+        if node.tag == tag:
+            return node
+        node = node.parent
+    return None
+
+
+def _in_script(html, pos):
+    """Whether offset pos of the raw HTML falls inside a <script> element."""
+    return html.rfind("<script", 0, pos) > html.rfind("</script", 0, pos)
+
+
+def scrape_zillow_sales(url, driver, unit=None):
+    """Scrape sale history from a Zillow property page using Selenium.
+
+    If unit is given, the rendered page is also saved to the page cache.
+    """
     try:
         driver.get(url)
         time.sleep(random.uniform(4, 7))
 
         page_source = driver.page_source
-        if "Access to this page has been denied" in page_source:
-            logger.warning("Zillow CAPTCHA detected for %s", url)
-            return None
+    except Exception as e:
+        logger.error("Zillow scrape error for %s: %s", url, e)
+        return None
+    if "Access to this page has been denied" in page_source:
+        logger.warning("Zillow CAPTCHA detected for %s", url)
+        return None
 
-        soup = BeautifulSoup(page_source, "lxml")
+    if unit is not None:
+        cache_page("zillow", unit, page_source)
+    return parse_zillow_sales(page_source, url)
+
+
+def parse_zillow_sales(page_source, url):
+    """Sale history from the rendered HTML of a Zillow property page."""
+    try:
+        tree = LexborHTMLParser(page_source)
+        tree.strip_tags(["script", "style"])
 
         # Zillow price history is typically in a section with "Price history"
         # Look for table rows with Sold events
@@ -176,39 +440,48 @@ def scrape_zillow_sales(url, driver):
         # Zillow uses various structures, let's try multiple approaches
 
         # Approach 1: Look for data-testid elements
-        history_rows = soup.select('[data-testid="price-history"] tr, [data-testid="priceHistory"] tr')
+        # (a selector list can match a node twice; dict.fromkeys dedupes in order)
+        history_rows = list(dict.fromkeys(
+            tree.css('[data-testid="price-history"] tr, [data-testid="priceHistory"] tr')
+        ))
 
         # Approach 2: Look for "Price history" heading and nearby table
+        region = None
         if not history_rows:
-            for heading in soup.find_all(["h2", "h3", "h4", "h5", "span"]):
-                if "Price history" in heading.get_text():
-                    parent = heading.find_parent("section") or heading.find_parent("div")
-                    if parent:
-                        history_rows = parent.select("tr")
+            for heading in tree.css("h2, h3, h4, h5, span"):
+                if "Price history" in heading.text():
+                    region = _find_parent(heading, "section") or _find_parent(heading, "div")
+                    if region:
+                        history_rows = region.css("tr")
                         break
 
-        # Approach 3: Regex fallback on full page text
+        # Approach 3: Regex fallback, on the price history section's text if
+        # there is one, then on the raw HTML. Never on the text of the whole
+        # page, which for Zillow's app is huge.
         if not history_rows:
-            text = soup.get_text()
-            # Pattern: date Sold price
-            pattern = re.compile(
-                r"(\d{1,2}/\d{1,2}/\d{4})\s+Sold\s+\$([0-9,]+)",
-                re.IGNORECASE
-            )
-            for match in pattern.finditer(text):
-                try:
-                    dt = datetime.strptime(match.group(1), "%m/%d/%Y")
-                    price = int(match.group(2).replace(",", ""))
-                    sales.append({"date": dt.strftime("%Y-%m-%d"), "price": price})
-                except ValueError:
-                    pass
+            texts = [region.text()] if region else []
+            texts.append(page_source)
+            for text in texts:
+                # Pattern: date Sold price
+                for match in _ZILLOW_SOLD_RE.finditer(text):
+                    if text is page_source and _in_script(page_source, match.start()):
+                        continue
+                    try:
+                        date_str = parse_date_us(match.group(1))
+                        price = int(match.group(2).replace(",", ""))
+                        sales.append({"date": date_str, "price": price})
+                    except ValueError:
+                        pass
+                if sales:
+                    break
             return sales
 
         for row in history_rows:
-            cells = row.select("td, th")
+            # Plain traversal: cheaper than compiling the "td, th" selector per row
+            cells = [node for node in row.traverse() if node.tag in ("td", "th")]
             if len(cells) < 3:
                 continue
-            row_text = [c.get_text(strip=True) for c in cells]
+            row_text = [c.text(strip=True) for c in cells]
 
             # Check if this is a "Sold" event
             event_text = " ".join(row_text).lower()
@@ -220,11 +493,10 @@ def scrape_zillow_sales(url, driver):
             price = None
             for cell_text in row_text:
                 # Date patterns
-                date_match = re.search(r"(\d{1,2}/\d{1,2}/\d{4})", cell_text)
+                date_match = _US_DATE_RE.search(cell_text)
                 if date_match:
                     try:
-                        dt = datetime.strptime(date_match.group(1), "%m/%d/%Y")
-                        date_str = dt.strftime("%Y-%m-%d")
+                        date_str = parse_date_us(date_match.group(0))
                     except ValueError:
                         pass
                 # Price
@@ -237,57 +509,184 @@ def scrape_zillow_sales(url, driver):
         return sales
 
     except Exception as e:
-        logger.error("Zillow scrape error for %s: %s", url, e)
+        logger.error("Zillow parse error for %s: %s", url, e)
         return None
 
 
-def scrape_all_zillow(properties):
-    """Scrape Zillow sales history for all properties using Selenium."""
-    import undetected_chromedriver as uc
+def _zillow_sales_from_page(html, url):
+    """Sale history from a cached Zillow page, whichever way it was fetched."""
+    history = _zillow_price_history(html)
+    if history is not None:
+        return _sales_from_zillow_history(history)
+    return parse_zillow_sales(html, url)
 
-    results = {}
-    driver = None
-    request_count = 0
 
-    try:
-        opts = uc.ChromeOptions()
-        driver = uc.Chrome(options=opts, headless=False)
+ZILLOW_BROWSERS = 3  # Chrome instances working through the Selenium fallback at once
+BROWSER_RESTART_EVERY = 6  # page loads per browser before restarting it to avoid CAPTCHA
 
-        for i, prop in enumerate(properties):
-            unit = prop["unit"]
-            url = prop["zillow_url"]
-            logger.info("Zillow %d/%d: Unit %d", i + 1, len(properties), unit)
 
-            # Restart browser every 6 requests to avoid CAPTCHA
-            if request_count > 0 and request_count % 6 == 0:
-                logger.info("Restarting browser to avoid CAPTCHA...")
-                driver.quit()
-                time.sleep(random.uniform(10, 15))
-                driver = uc.Chrome(options=opts, headless=False)
+def _new_browser(user_agent):
+    """Start a Chrome instance presenting the given User-Agent."""
+    import undetected_chromedriver as uc
 
-            sales = scrape_zillow_sales(url, driver)
-            request_count += 1
+    # undetected_chromedriver refuses to reuse an options object, so build one per launch
+    opts = uc.ChromeOptions()
+    opts.add_argument(f"--user-agent={user_agent}")
+    return uc.Chrome(options=opts, headless=False)
 
-            if sales is not None:
-                results[unit] = sales
-                logger.info("  Found %d sales", len(sales))
-            else:
-                results[unit] = []
-                logger.warning("  Failed to scrape (CAPTCHA or error)")
 
-            if i < len(properties) - 1:
-                time.sleep(random.uniform(3, 6))
+def _quit_browser(driver):
+    """Quit a Chrome instance, logging rather than raising if that fails."""
+    try:
+        driver.quit()
+    except Exception as e:
+        logger.warning("Error quitting Chrome driver: %s", e)
+
+
+def scrape_all_zillow(properties, journal=None, refetch=False):
+    """Scrape Zillow sales history for all properties.
+
+    Pages cached within PAGE_CACHE_TTL are reused unless refetch is set.
+    Otherwise each page is first fetched over plain HTTP (fetch_zillow_sales).
+    Only pages that come back blocked or without the embedded JSON are loaded
+    in Selenium. Up to ZILLOW_BROWSERS worker threads each own one persistent
+    browser with its own User-Agent, started on first use and restarted
+    every BROWSER_RESTART_EVERY loads. Results are logged in property order.
+    """
+    local = threading.local()
+    browsers = []  # every worker's browser state, so all of them get shut down
+    browsers_lock = threading.Lock()
+
+    def _browser():
+        state = getattr(local, "browser", None)
+        if state is None:
+            user_agent = random.choice(config.USER_AGENTS)
+            state = local.browser = {"ua": user_agent, "driver": _new_browser(user_agent), "loads": 0}
+            with browsers_lock:
+                browsers.append(state)
+        elif state["loads"] % BROWSER_RESTART_EVERY == 0:
+            logger.info("Restarting browser to avoid CAPTCHA...")
+            _quit_browser(state["driver"])
+            time.sleep(random.uniform(10, 15))
+            state["driver"] = _new_browser(state["ua"])
+        return state
+
+    def _scrape_unit(prop):
+        url, unit = prop["zillow_url"], prop["unit"]
+        if not refetch:
+            html = read_cached_page("zillow", unit)
+            if html is not None:
+                return _zillow_sales_from_page(html, url)
+
+        sales = fetch_zillow_sales(url, unit)
+        if sales is not None:
+            time.sleep(random.uniform(config.MIN_DELAY, config.MAX_DELAY))
+            return sales
 
+        logger.info("  Unit %d: no price history over HTTP, loading in browser", unit)
+        state = _browser()
+        sales = scrape_zillow_sales(url, state["driver"], unit)
+        state["loads"] += 1
+        time.sleep(random.uniform(3, 6))
+        return sales
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=ZILLOW_BROWSERS) as pool:
+            for i, (prop, sales) in enumerate(zip(properties, pool.map(_scrape_unit, properties))):
+                unit = prop["unit"]
+                logger.info("Zillow %d/%d: Unit %d", i + 1, len(properties), unit)
+                if sales is not None:
+                    results[unit] = sales
+                    logger.info("  Found %d sales", len(sales))
+                else:
+                    results[unit] = []
+                    logger.warning("  Failed to scrape (CAPTCHA or error)")
+                _journal(journal, "zillow", unit, results[unit])
     finally:
-        if driver:
-            driver.quit()
+        for state in browsers:
+            _quit_browser(state["driver"])
 
     return results
 
 
+_MATCH_WINDOW_DAYS = 60
+# Buckets one day wider than the window: two dates within it always land in
+# the same or adjacent buckets.
+_DATE_BUCKET_DAYS = _MATCH_WINDOW_DAYS + 1
+
+
+@functools.lru_cache(maxsize=None)
+def _date_ordinal(date_str):
+    """YYYY-MM-DD -> day number, or None if it isn't a valid date.
+
+    Parsed by hand rather than with strptime, and cached because the same
+    sale dates recur across the HOA, Redfin and Zillow records.
+    """
+    match = _ISO_DATE_RE.fullmatch(date_str)
+    if not match:
+        return None
+    try:
+        return date(int(match.group(1)), int(match.group(2)), int(match.group(3))).toordinal()
+    except ValueError:
+        return None
+
+
+def _bucket_by_date(ordinals):
+    """Map date bucket -> indexes of the records whose date falls in it."""
+    buckets = defaultdict(list)
+    for i, ordinal in enumerate(ordinals):
+        if ordinal is not None:
+            buckets[ordinal // _DATE_BUCKET_DAYS].append(i)
+    return buckets
+
+
+def _add_dated(buckets, ordinals, ordinal):
+    """Append ordinal to ordinals and index it in buckets."""
+    if ordinal is not None:
+        buckets[ordinal // _DATE_BUCKET_DAYS].append(len(ordinals))
+    ordinals.append(ordinal)
+
+
+def _date_candidates(buckets, ordinals, ordinal):
+    """Indexes (ascending) of records dated within the match window of ordinal."""
+    if ordinal is None:
+        return []
+    b = ordinal // _DATE_BUCKET_DAYS
+    nearby = buckets.get(b - 1, []) + buckets.get(b, []) + buckets.get(b + 1, [])
+    return sorted(i for i in nearby if abs(ordinals[i] - ordinal) <= _MATCH_WINDOW_DAYS)
+
+
+def consolidate_results():
+    """Fold RESULTS_JOURNAL into RESULTS_PATH with one rewrite, then remove it.
+
+    A journal left behind by an interrupted run is picked up here too, so
+    the units it did finish are not lost.
+    """
+    saved = {}
+    if os.path.exists(RESULTS_PATH):
+        with open(RESULTS_PATH) as f:
+            saved = json.load(f)
+    if os.path.exists(RESULTS_JOURNAL):
+        with open(RESULTS_JOURNAL) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # blank or half-written last line
+                saved.setdefault(rec["source"], {})[str(rec["unit"])] = rec["sales"]
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(saved, f, indent=2)
+    if os.path.exists(RESULTS_JOURNAL):
+        os.remove(RESULTS_JOURNAL)
+
+
 def compare_sales(hoa_sales, redfin_sales, zillow_sales):
-    """Compare scraped sales against HOA records. Returns report lines."""
-    lines = []
+    """Compare scraped sales against HOA records.
+
+    A generator of report lines (without newlines), so the caller can write
+    the report out as it is produced instead of building one big string.
+    """
     all_units = sorted(set(
         list(hoa_sales.keys()) +
         list(redfin_sales.keys()) +
@@ -301,46 +700,32 @@ def compare_sales(hoa_sales, redfin_sales, zillow_sales):
 
     for unit in all_units:
         hoa = hoa_sales.get(unit, [])
-        # Deduplicate Redfin/Zillow records (same date+price)
-        redfin_raw = redfin_sales.get(unit, [])
-        redfin = []
-        seen_r = set()
-        for r in redfin_raw:
-            key = (r["date"], r["price"])
-            if key not in seen_r:
-                seen_r.add(key)
-                redfin.append(r)
-        zillow_raw = zillow_sales.get(unit, [])
-        zillow = []
-        seen_z = set()
-        for z in zillow_raw:
-            key = (z["date"], z["price"])
-            if key not in seen_z:
-                seen_z.add(key)
-                zillow.append(z)
-
-        # For comparison, match sales by price (within $500) and approximate date (within 60 days)
+        # Deduplicate Redfin/Zillow records (same date+price), keeping first-seen order
+        redfin = list({(r["date"], r["price"]): r for r in redfin_sales.get(unit, [])}.values())
+        zillow = list({(z["date"], z["price"]): z for z in zillow_sales.get(unit, [])}.values())
+
+        # For comparison, match sales by price (within $500) and approximate date (within 60 days).
+        # Dates are parsed once, and each source is bucketed by date so only
+        # candidates in the same or an adjacent bucket are compared.
+        hoa_ords = [_date_ordinal(h["date"]) for h in hoa]
+        redfin_ords = [_date_ordinal(r["date"]) for r in redfin]
+        zillow_ords = [_date_ordinal(z["date"]) for z in zillow]
+        redfin_buckets = _bucket_by_date(redfin_ords)
+        zillow_buckets = _bucket_by_date(zillow_ords)
+
         hoa_matched = set()
         redfin_matched = set()
         zillow_matched = set()
 
-        def dates_close(d1, d2, days=60):
-            """Check if two YYYY-MM-DD date strings are within N days."""
-            try:
-                dt1 = datetime.strptime(d1, "%Y-%m-%d")
-                dt2 = datetime.strptime(d2, "%Y-%m-%d")
-                return abs((dt1 - dt2).days) <= days
-            except ValueError:
-                return False
-
         # Match HOA sales to Redfin sales (price within 1% or $1000)
         for hi, h in enumerate(hoa):
-            for ri, r in enumerate(redfin):
+            for ri in _date_candidates(redfin_buckets, redfin_ords, hoa_ords[hi]):
                 if ri in redfin_matched:
                     continue
+                r = redfin[ri]
                 price_diff = abs(h["price"] - r["price"])
                 pct_diff = price_diff / max(h["price"], 1) * 100
-                if (price_diff <= 1000 or pct_diff <= 1.0) and dates_close(h["date"], r["date"]):
+                if price_diff <= 1000 or pct_diff <= 1.0:
                     hoa_matched.add(hi)
                     redfin_matched.add(ri)
                     mismatch_info = {
@@ -359,12 +744,13 @@ def compare_sales(hoa_sales, redfin_sales, zillow_sales):
         for hi, h in enumerate(hoa):
             if hi in hoa_matched:
                 continue
-            for zi, z in enumerate(zillow):
+            for zi in _date_candidates(zillow_buckets, zillow_ords, hoa_ords[hi]):
                 if zi in zillow_matched:
                     continue
+                z = zillow[zi]
                 price_diff = abs(h["price"] - z["price"])
                 pct_diff = price_diff / max(h["price"], 1) * 100
-                if (price_diff <= 1000 or pct_diff <= 1.0) and dates_close(h["date"], z["date"]):
+                if price_diff <= 1000 or pct_diff <= 1.0:
                     hoa_matched.add(hi)
                     zillow_matched.add(zi)
                     mismatch_info = {
@@ -379,27 +765,34 @@ def compare_sales(hoa_sales, redfin_sales, zillow_sales):
                         stats["matched"] += 1
                     break
 
+        # This unit's new sales so far, bucketed by date the same way
+        new_ords = []
+        new_prices = []
+        new_buckets = defaultdict(list)
+
         # Redfin sales not in HOA
         for ri, r in enumerate(redfin):
             if ri not in redfin_matched:
                 # Check if it's in zillow too (corroborated)
                 corroborated = any(
-                    abs(r["price"] - z["price"]) <= 1000 and dates_close(r["date"], z["date"])
-                    for z in zillow
+                    abs(r["price"] - zillow[zi]["price"]) <= 1000
+                    for zi in _date_candidates(zillow_buckets, zillow_ords, redfin_ords[ri])
                 )
                 new_sales.append({
                     "unit": unit, "date": r["date"], "price": r["price"],
                     "source": "redfin", "corroborated": corroborated
                 })
                 stats["new"] += 1
+                _add_dated(new_buckets, new_ords, redfin_ords[ri])
+                new_prices.append(r["price"])
 
         # Zillow sales not in HOA and not already counted from Redfin
         for zi, z in enumerate(zillow):
             if zi not in zillow_matched:
                 # Check if already found via Redfin
                 already_found = any(
-                    abs(z["price"] - ns["price"]) <= 1000 and dates_close(z["date"], ns["date"])
-                    for ns in new_sales if ns["unit"] == unit
+                    abs(z["price"] - new_prices[ni]) <= 1000
+                    for ni in _date_candidates(new_buckets, new_ords, zillow_ords[zi])
                 )
                 if not already_found:
                     new_sales.append({
@@ -407,6 +800,8 @@ def compare_sales(hoa_sales, redfin_sales, zillow_sales):
                         "source": "zillow", "corroborated": False
                     })
                     stats["new"] += 1
+                    _add_dated(new_buckets, new_ords, zillow_ords[zi])
+                    new_prices.append(z["price"])
 
         # HOA sales not found in either source
         for hi, h in enumerate(hoa):
@@ -415,25 +810,25 @@ def compare_sales(hoa_sales, redfin_sales, zillow_sales):
                 stats["missing"] += 1
 
     # Build report
-    lines.append("=" * 70)
-    lines.append("WOODGATE SALES COMPARISON REPORT")
-    lines.append("=" * 70)
-    lines.append("")
-    lines.append(f"HOA records: {sum(len(v) for v in hoa_sales.values())} sales")
-    lines.append(f"Redfin records: {sum(len(v) for v in redfin_sales.values())} sales")
-    lines.append(f"Zillow records: {sum(len(v) for v in zillow_sales.values())} sales")
-    lines.append("")
-    lines.append(f"Exact matches: {stats['matched']}")
-    lines.append(f"Date mismatches (same sale, different date): {stats['date_mismatch']}")
-    lines.append(f"New sales (online but not in HOA): {stats['new']}")
-    lines.append(f"Missing online (in HOA but not found): {stats['missing']}")
-    lines.append("")
+    yield "=" * 70
+    yield "WOODGATE SALES COMPARISON REPORT"
+    yield "=" * 70
+    yield ""
+    yield f"HOA records: {sum(len(v) for v in hoa_sales.values())} sales"
+    yield f"Redfin records: {sum(len(v) for v in redfin_sales.values())} sales"
+    yield f"Zillow records: {sum(len(v) for v in zillow_sales.values())} sales"
+    yield ""
+    yield f"Exact matches: {stats['matched']}"
+    yield f"Date mismatches (same sale, different date): {stats['date_mismatch']}"
+    yield f"New sales (online but not in HOA): {stats['new']}"
+    yield f"Missing online (in HOA but not found): {stats['missing']}"
+    yield ""
 
     if date_mismatches:
-        lines.append("-" * 70)
-        lines.append("MISMATCHES (date and/or price differ)")
-        lines.append("-" * 70)
-        for dm in sorted(date_mismatches, key=lambda x: (x["unit"], x["hoa_date"])):
+        yield "-" * 70
+        yield "MISMATCHES (date and/or price differ)"
+        yield "-" * 70
+        for dm in sorted(date_mismatches, key=itemgetter("unit", "hoa_date")):
             src = dm["source"]
             other_date = dm.get(f"{src}_date")
             other_price = dm.get(f"{src}_price", dm.get("hoa_price"))
@@ -445,32 +840,30 @@ def compare_sales(hoa_sales, redfin_sales, zillow_sales):
             if hoa_price != other_price:
                 price_note = f"price: HOA ${hoa_price:,} vs {src.title()} ${other_price:,}"
             detail = " | ".join(filter(None, [date_note, price_note]))
-            lines.append(f"  Unit {dm['unit']:3d} | ${hoa_price:>9,} | {detail}")
-        lines.append("")
+            yield f"  Unit {dm['unit']:3d} | ${hoa_price:>9,} | {detail}"
+        yield ""
 
     if new_sales:
-        lines.append("-" * 70)
-        lines.append("NEW SALES (found online, not in HOA records)")
-        lines.append("-" * 70)
-        for ns in sorted(new_sales, key=lambda x: (x["unit"], x["date"])):
+        yield "-" * 70
+        yield "NEW SALES (found online, not in HOA records)"
+        yield "-" * 70
+        for ns in sorted(new_sales, key=itemgetter("unit", "date")):
             corr = " [corroborated]" if ns["corroborated"] else ""
-            lines.append(
+            yield (
                 f"  Unit {ns['unit']:3d} | {ns['date']} | ${ns['price']:>9,} | "
                 f"{ns['source'].title()}{corr}"
             )
-        lines.append("")
+        yield ""
 
     if missing_online:
-        lines.append("-" * 70)
-        lines.append("MISSING ONLINE (in HOA but not found on Redfin/Zillow)")
-        lines.append("-" * 70)
-        for mo in sorted(missing_online, key=lambda x: (x["unit"], x["date"])):
-            lines.append(
+        yield "-" * 70
+        yield "MISSING ONLINE (in HOA but not found on Redfin/Zillow)"
+        yield "-" * 70
+        for mo in sorted(missing_online, key=itemgetter("unit", "date")):
+            yield (
                 f"  Unit {mo['unit']:3d} | {mo['date']} | ${mo['price']:>9,}"
             )
-        lines.append("")
-
-    return "\n".join(lines)
+        yield ""
 
 
 def main():
@@ -480,8 +873,14 @@ def main():
     parser.add_argument("--zillow-only", action="store_true", help="Only scrape Zillow")
     parser.add_argument("--compare-only", action="store_true",
                         help="Skip scraping, compare from saved results")
+    parser.add_argument("--refetch", action="store_true",
+                        help="Ignore cached pages and fetch every page again")
     args = parser.parse_args()
 
+    if not config.BROTLI_AVAILABLE:
+        logger.warning("brotli is not installed, so pages are fetched gzip-compressed "
+                       "(pip install brotli)")
+
     properties = load_properties()
     hoa_sales = load_hoa_sales()
 
@@ -498,34 +897,39 @@ def main():
         redfin_sales = {}
         zillow_sales = {}
 
-        if not args.zillow_only:
-            logger.info("Starting Redfin scrape for %d properties...", len(properties))
-            redfin_sales = scrape_all_redfin(properties)
-
-        if not args.redfin_only:
-            logger.info("Starting Zillow scrape for %d properties...", len(properties))
-            zillow_sales = scrape_all_zillow(properties)
+        # Each unit's results are appended to the journal as they arrive, and
+        # the full results file is rewritten once at the end
+        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+        # The two sites are rate-limited independently, so the Redfin and
+        # Zillow stages run side by side rather than one after the other
+        with open(RESULTS_JOURNAL, "a") as journal, ThreadPoolExecutor(max_workers=2) as stages:
+            try:
+                redfin_future = zillow_future = None
+                if not args.zillow_only:
+                    logger.info("Starting Redfin scrape for %d properties...", len(properties))
+                    redfin_future = stages.submit(scrape_all_redfin, properties, journal, args.refetch)
+
+                if not args.redfin_only:
+                    logger.info("Starting Zillow scrape for %d properties...", len(properties))
+                    zillow_future = stages.submit(scrape_all_zillow, properties, journal, args.refetch)
+
+                if redfin_future is not None:
+                    redfin_sales = redfin_future.result()
+                if zillow_future is not None:
+                    zillow_sales = zillow_future.result()
+            finally:
+                stages.shutdown(wait=True)
+                SESSION.close()
 
         # Save raw results
-        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
-        saved = {}
-        if os.path.exists(RESULTS_PATH):
-            with open(RESULTS_PATH) as f:
-                saved = json.load(f)
-        if redfin_sales:
-            saved["redfin"] = {str(k): v for k, v in redfin_sales.items()}
-        if zillow_sales:
-            saved["zillow"] = {str(k): v for k, v in zillow_sales.items()}
-        with open(RESULTS_PATH, "w") as f:
-            json.dump(saved, f, indent=2)
+        consolidate_results()
         logger.info("Saved raw results to %s", RESULTS_PATH)
 
     # Compare
-    report = compare_sales(hoa_sales, redfin_sales, zillow_sales)
-    print(report)
-
     with open(REPORT_PATH, "w") as f:
-        f.write(report)
+        for line in compare_sales(hoa_sales, redfin_sales, zillow_sales):
+            print(line)
+            f.write(line + "\n")
     logger.info("Report saved to %s", REPORT_PATH)
 
 
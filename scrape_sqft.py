@@ -7,69 +7,106 @@ import os
 import random
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 
 import config
+from http_session import make_session, next_user_agent
 
 SQFT_PATH = os.path.join(config.DATA_DIR, "sqft.json")
+# Append-only log of units scraped this run, folded into SQFT_PATH at the end
+SQFT_JOURNAL = os.path.join(config.DATA_DIR, "sqft.jsonl")
+
+_DIGITS_RE = re.compile(r"(\d+)")
+_SQFT_RE = re.compile(r"([\d,]+)\s*sq\s*ft", re.IGNORECASE)
+
+SESSION = make_session()
 
 
 def _get_headers() -> dict:
-    return {
-        "User-Agent": random.choice(config.USER_AGENTS),
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Connection": "keep-alive",
-    }
+    """Per-request headers; the fixed ones are already set on SESSION."""
+    return {"User-Agent": next_user_agent()}
 
 
 def scrape_sqft(url: str) -> int | None:
     """Extract square footage from a Redfin listing page."""
     try:
-        resp = requests.get(url, headers=_get_headers(), timeout=15)
+        resp = SESSION.get(url, headers=_get_headers(), timeout=15)
         resp.raise_for_status()
     except requests.RequestException as e:
         print(f"  Failed to fetch {url}: {e}")
         return None
 
-    soup = BeautifulSoup(resp.text, "lxml")
+    tree = LexborHTMLParser(resp.text)
 
     # Primary: data-rf-test-id="abp-sqFt"
-    el = soup.select_one('[data-rf-test-id="abp-sqFt"]')
+    el = tree.css_first('[data-rf-test-id="abp-sqFt"]')
     if el:
-        text = el.get_text().replace(",", "")
-        match = re.search(r"(\d+)", text)
+        text = el.text().replace(",", "")
+        match = _DIGITS_RE.search(text)
         if match:
             return int(match.group(1))
 
     # Fallback: class containing sqft-section
-    el = soup.select_one(".sqft-section")
+    el = tree.css_first(".sqft-section")
     if el:
-        text = el.get_text().replace(",", "")
-        match = re.search(r"(\d+)", text)
+        text = el.text().replace(",", "")
+        match = _DIGITS_RE.search(text)
         if match:
             return int(match.group(1))
 
-    # Last resort: regex
-    text = soup.get_text()
-    match = re.search(r"([\d,]+)\s*sq\s*ft", text, re.IGNORECASE)
+    # Last resort: regex over the visible page text
+    tree.strip_tags(["script", "style"])
+    text = tree.text()
+    match = _SQFT_RE.search(text)
     if match:
         return int(match.group(1).replace(",", ""))
 
     return None
 
 
-def main():
-    # Load existing results to allow resuming
+def _scrape_sqft_politely(url: str) -> int | None:
+    """scrape_sqft() after the usual rate-limit pause, run on a worker thread."""
+    time.sleep(random.uniform(config.MIN_DELAY, config.MAX_DELAY))
+    return scrape_sqft(url)
+
+
+def _load_results() -> dict:
+    """sqft.json plus anything an interrupted run left in the journal."""
+    results = {}
     if os.path.exists(SQFT_PATH):
         with open(SQFT_PATH) as f:
             results = json.load(f)
+    if os.path.exists(SQFT_JOURNAL):
+        with open(SQFT_JOURNAL) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # blank or half-written last line
+                results[rec["unit"]] = rec["sqft"]
+    return results
+
+
+def _save_results(results: dict):
+    """Rewrite sqft.json once and drop the journal it now contains."""
+    with open(SQFT_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+    if os.path.exists(SQFT_JOURNAL):
+        os.remove(SQFT_JOURNAL)
+
+
+def main():
+    if not config.BROTLI_AVAILABLE:
+        print("Note: brotli is not installed, so pages are fetched gzip-compressed "
+              "(pip install brotli)")
+
+    # Load existing results to allow resuming
+    results = _load_results()
+    if results:
         print(f"Loaded {len(results)} existing sqft records")
-    else:
-        results = {}
 
     # Read properties.csv
     units = []
@@ -79,32 +116,31 @@ def main():
             units.append((row["unit_number"], row["redfin_url"]))
 
     total = len(units)
-    skipped = 0
+    pending = [(i, unit, url) for i, (unit, url) in enumerate(units) if unit not in results]
+    skipped = total - len(pending)
     scraped = 0
     failed = 0
 
-    for i, (unit, url) in enumerate(units):
-        if unit in results:
-            skipped += 1
-            continue
-
-        print(f"[{i+1}/{total}] Unit {unit}...", end=" ")
-        sqft = scrape_sqft(url)
-        if sqft:
-            results[unit] = sqft
-            scraped += 1
-            print(f"{sqft} sq ft")
-        else:
-            failed += 1
-            print("FAILED")
-
-        # Save after each successful scrape
-        with open(SQFT_PATH, "w") as f:
-            json.dump(results, f, indent=2)
-
-        # Rate limit
-        if i < total - 1:
-            time.sleep(random.uniform(config.MIN_DELAY, config.MAX_DELAY))
+    try:
+        # Fetch up to config.MAX_WORKERS pages at once; results come back in order.
+        # Each success is appended to the journal so an interrupted run can resume.
+        with ThreadPoolExecutor(max_workers=config.MAX_WORKERS) as pool, \
+                open(SQFT_JOURNAL, "a") as journal:
+            sqfts = pool.map(_scrape_sqft_politely, [url for _, _, url in pending])
+            for (i, unit, _), sqft in zip(pending, sqfts):
+                print(f"[{i+1}/{total}] Unit {unit}...", end=" ")
+                if sqft:
+                    results[unit] = sqft
+                    scraped += 1
+                    print(f"{sqft} sq ft")
+                    journal.write(json.dumps({"unit": unit, "sqft": sqft}) + "\n")
+                    journal.flush()
+                else:
+                    failed += 1
+                    print("FAILED")
+    finally:
+        SESSION.close()
+        _save_results(results)
 
     print(f"\nDone: {scraped} scraped, {skipped} skipped, {failed} failed")
     print(f"Total sqft records: {len(results)}")
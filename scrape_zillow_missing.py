@@ -6,8 +6,10 @@ import logging
 import random
 import time
 
+from sqlalchemy import select
+
 import config
-from db import Estimate, SessionLocal, add_estimate, get_all_properties
+from db import Estimate, SessionLocal, add_estimate, get_scrape_targets
 from scraper import cleanup_driver, scrape_zillow
 
 logging.basicConfig(level=logging.INFO, format=config.LOG_FORMAT)
@@ -18,14 +20,12 @@ BROWSER_RESTART_EVERY = 6  # restart browser every N properties to avoid CAPTCHA
 
 def main():
     session = SessionLocal()
-    props = get_all_properties(session)
-
-    # Find properties missing Zillow estimates
-    missing = []
-    for p in props:
-        has_zillow = session.query(Estimate).filter_by(property_id=p.id, source="zillow").count()
-        if has_zillow == 0 and p.zillow_url:
-            missing.append(p)
+    # Find properties missing Zillow estimates: one DISTINCT query for the ids
+    # that have one, rather than a COUNT query per property
+    has_zillow = set(session.scalars(
+        select(Estimate.property_id).where(Estimate.source == "zillow").distinct()
+    ))
+    missing = [p for p in get_scrape_targets(session) if p.zillow_url and p.id not in has_zillow]
 
     print(f"Properties missing Zillow estimates: {len(missing)}")
     if not missing:
@@ -40,7 +40,7 @@ def main():
             # Restart browser periodically to avoid CAPTCHA buildup
             if i > 0 and i % BROWSER_RESTART_EVERY == 0:
                 logger.info("Restarting browser to avoid CAPTCHA (after %d properties)", i)
-                cleanup_driver()
+                cleanup_driver(fresh_profile=True)
                 time.sleep(random.uniform(15, 25))
 
             logger.info("[%d/%d] Scraping Zillow for %s", i + 1, len(missing), prop.address)
@@ -1,39 +1,208 @@
 from __future__ import annotations
 
 import logging
+import os
+import queue
 import random
 import re
+import shutil
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from urllib.parse import urlsplit
 
 import requests
-from bs4 import BeautifulSoup
 import undetected_chromedriver as uc
+from selectolax.lexbor import LexborHTMLParser
+from sqlalchemy.exc import OperationalError
 
 import config
-from db import SessionLocal, add_estimate
+from db import (
+    PropertyRow,
+    SessionLocal,
+    UrlSelectorRow,
+    add_estimates,
+    get_url_selectors,
+    save_url_selectors,
+)
+from http_session import make_session
 
 logger = logging.getLogger(__name__)
 
-# Shared undetected Chrome driver (created lazily)
-_driver = None
+# Patterns used on every page, compiled once at import
+_ZESTIMATE_RE = re.compile(r"Zestimate[^$]*\$([0-9,]+)", re.IGNORECASE)
+_REDFIN_ESTIMATE_RE = re.compile(r"Redfin Estimate[^$]*\$([0-9,]+)", re.IGNORECASE)
+_PRICE_STRIP = str.maketrans("", "", ",$")
 
+ZILLOW_BROWSERS = 3  # Chrome instances scrape_batch loads Zillow pages in at once
 
-def _get_driver():
-    """Get or create a shared undetected Chrome driver."""
-    global _driver
-    if _driver is None:
+# Idle undetected Chrome drivers. They are started lazily, up to
+# ZILLOW_BROWSERS, and each is lent to one thread at a time.
+_driver_pool: queue.Queue = queue.Queue()
+_drivers_started = 0
+_drivers_lock = threading.Lock()
+# Profile directories not held by a running driver, and which one each driver holds
+_free_profile_slots: queue.Queue = queue.Queue()
+for _slot in range(ZILLOW_BROWSERS):
+    _free_profile_slots.put(_slot)
+_driver_slots: dict[int, int] = {}
+
+# One pooled session so Redfin fetches reuse connections across properties
+SESSION = make_session()
+
+
+def _profile_dir(slot: int) -> str:
+    return os.path.join(config.CHROME_PROFILE_DIR, f"scraper-{slot}")
+
+
+def _new_driver():
+    """Start an undetected Chrome instance with its own User-Agent and profile."""
+    # Chrome locks its profile, so each running driver needs a directory of its own
+    slot = _free_profile_slots.get_nowait()
+    try:
         opts = uc.ChromeOptions()
-        _driver = uc.Chrome(options=opts, headless=False)
-    return _driver
+        opts.add_argument(f"--user-agent={random.choice(config.USER_AGENTS)}")
+        driver = uc.Chrome(
+            options=opts,
+            headless=False,
+            user_data_dir=_profile_dir(slot),
+            driver_executable_path=config.CHROMEDRIVER_PATH,
+            version_main=config.CHROME_VERSION_MAIN,
+        )
+    except Exception:
+        _free_profile_slots.put(slot)
+        raise
+    _driver_slots[id(driver)] = slot
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": config.CHROME_BLOCKED_URLS})
+    except Exception as e:
+        logger.warning("Could not block image/font requests: %s", e)
+    return driver
 
 
-def cleanup_driver():
-    """Shut down the shared Chrome driver."""
-    global _driver
-    if _driver is not None:
-        _driver.quit()
-        _driver = None
+def _get_driver():
+    """Borrow an idle Chrome driver, starting one if fewer than ZILLOW_BROWSERS are running.
+
+    Blocks until a driver is free. Hand it back with _release_driver().
+    """
+    global _drivers_started
+    try:
+        return _driver_pool.get_nowait()
+    except queue.Empty:
+        pass
+    with _drivers_lock:
+        start = _drivers_started < ZILLOW_BROWSERS
+        if start:
+            _drivers_started += 1
+    if not start:
+        return _driver_pool.get()
+    try:
+        return _new_driver()
+    except Exception:
+        with _drivers_lock:
+            _drivers_started -= 1
+        raise
+
+
+def _release_driver(driver):
+    _driver_pool.put(driver)
+
+
+def _forget_zillow(driver) -> bool:
+    """Clear Zillow's cookies and site storage from a driver's profile.
+
+    Returns False if Chrome would not do it.
+    """
+    try:
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin", {
+            "origin": "https://www.zillow.com",
+            "storageTypes": "cookies,local_storage,session_storage,indexeddb,service_workers,cache_storage",
+        })
+    except Exception as e:
+        logger.warning("Could not clear Zillow site data: %s", e)
+        return False
+    return True
+
+
+def _discard_driver(driver, fresh_profile: bool = False):
+    """Quit a borrowed driver instead of handing it back.
+
+    With fresh_profile the next driver on its profile starts without the
+    cookies and site storage Zillow has tied to this one. The HTTP cache of
+    page assets is kept unless Chrome refuses to clear the site data, in
+    which case the whole profile directory is deleted.
+    """
+    global _drivers_started
+    slot = _driver_slots.pop(id(driver))
+    cleared = not fresh_profile or _forget_zillow(driver)
+    try:
+        driver.quit()
+    except Exception as e:
+        logger.warning("Error quitting Chrome driver: %s", e)
+    if not cleared:
+        # Chrome is gone, so its whole profile can go instead
+        shutil.rmtree(_profile_dir(slot), ignore_errors=True)
+    # Only once Chrome is gone may another driver take over its profile
+    _free_profile_slots.put(slot)
+    with _drivers_lock:
+        _drivers_started -= 1
+
+
+def cleanup_driver(fresh_profile: bool = False):
+    """Shut down the idle Chrome drivers.
+
+    Pass fresh_profile to also drop the Zillow cookies and site storage
+    their profiles hold (see _discard_driver).
+    """
+    while True:
+        try:
+            driver = _driver_pool.get_nowait()
+        except queue.Empty:
+            break
+        _discard_driver(driver, fresh_profile)
+
+
+def cleanup_session():
+    """Close the pooled HTTP connections; SESSION reconnects if used again."""
+    SESSION.close()
+
+
+class HostRateLimiter:
+    """Spaces out requests to each host, across all threads.
+
+    acquire() waits only until the URL's host is due again, so a pause for
+    one site never holds up another. Each call pushes that host's next slot
+    back by a random gap drawn from its (min, max) interval.
+    """
+
+    def __init__(self, intervals: dict[str, tuple[float, float]], default: tuple[float, float]):
+        self._intervals = intervals
+        self._default = default
+        self._next_allowed: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str) -> None:
+        host = urlsplit(url).netloc
+        low, high = self._intervals.get(host, self._default)
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_allowed.get(host, now))
+            self._next_allowed[host] = start + random.uniform(low, high)
+        if start > now:
+            time.sleep(start - now)
+
+
+# Gaps between request starts per host, shared by all of scraper.py's workers
+RATE_LIMITER = HostRateLimiter(
+    {
+        "www.redfin.com": (config.REDFIN_MIN_GAP, config.REDFIN_MAX_GAP),
+        "www.zillow.com": (config.ZILLOW_MIN_GAP, config.ZILLOW_MAX_GAP),
+    },
+    default=(config.MIN_DELAY, config.MAX_DELAY),
+)
 
 
 @dataclass
@@ -46,65 +215,134 @@ class ScrapeResult:
 
 
 def _get_headers() -> dict:
-    return {
-        "User-Agent": random.choice(config.USER_AGENTS),
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Connection": "keep-alive",
-    }
-
-
-def _fetch_page(url: str) -> BeautifulSoup | None:
+    """Per-request headers; the fixed ones are already set on SESSION."""
+    return {"User-Agent": random.choice(config.USER_AGENTS)}
+
+
+def _fetch_page(url: str, known: UrlSelectorRow | None = None) -> requests.Response | None:
+    """GET a page, conditionally if a previous fetch left an ETag/Last-Modified.
+
+    The body is streamed, so the caller must close the response. A 304
+    response comes back as is; the caller falls back to what it stored.
+    """
+    headers = _get_headers()
+    if known is not None:
+        if known.etag:
+            headers["If-None-Match"] = known.etag
+        if known.last_modified:
+            headers["If-Modified-Since"] = known.last_modified
+    RATE_LIMITER.acquire(url)
+    try:
+        resp = SESSION.get(url, headers=headers, timeout=15, stream=True)
+    except requests.RequestException as e:
+        logger.error("Failed to fetch %s: %s", url, e)
+        return None
     try:
-        resp = requests.get(url, headers=_get_headers(), timeout=15)
         resp.raise_for_status()
-        return BeautifulSoup(resp.text, "lxml")
+        return resp
     except requests.RequestException as e:
+        resp.close()
         logger.error("Failed to fetch %s: %s", url, e)
         return None
 
 
 def _parse_price(text: str) -> float | None:
-    """Extract a numeric price from text like '$425,000' or '$425K'."""
+    """Extract a numeric price from text like '$425,000' or '$425K'.
+
+    One pass over the number runs: the first number followed by K wins,
+    else the first followed by M, else the first number at all.
+    """
     if not text:
         return None
-    text = text.strip().replace(",", "").replace("$", "")
-    match = re.search(r"(\d+\.?\d*)\s*[Kk]", text)
-    if match:
-        return float(match.group(1)) * 1000
-    match = re.search(r"(\d+\.?\d*)\s*[Mm]", text)
-    if match:
-        return float(match.group(1)) * 1_000_000
-    match = re.search(r"(\d+\.?\d*)", text)
-    if match:
-        return float(match.group(1))
+    text = text.translate(_PRICE_STRIP)
+    n = len(text)
+    first = first_m = None
+    i = 0
+    while i < n:
+        if not text[i].isdecimal():
+            i += 1
+            continue
+        # The number is a run of digits, optionally "." and more digits
+        j = i + 1
+        while j < n and text[j].isdecimal():
+            j += 1
+        end = j
+        if end < n and text[end] == ".":
+            end += 1
+            while end < n and text[end].isdecimal():
+                end += 1
+        k = end
+        while k < n and text[k].isspace():
+            k += 1
+        suffix = text[k] if k < n else ""
+        if suffix in ("K", "k"):
+            return float(text[i:end]) * 1000
+        if first_m is None and suffix in ("M", "m"):
+            first_m = text[i:end]
+        if first is None:
+            first = text[i:end]
+        # Digits after a "." start a number of their own too
+        i = j
+    if first_m is not None:
+        return float(first_m) * 1_000_000
+    return float(first) if first is not None else None
+
+
+def _search_html(pattern: re.Pattern, html: str) -> re.Match | None:
+    """First match of pattern in raw HTML outside <script> and <style> elements.
+
+    Scanning the markup directly is far cheaper than building the text of
+    the whole page, and the estimate patterns don't care about the tags.
+    """
+    for match in pattern.finditer(html):
+        pos = match.start()
+        if not any(
+            html.rfind(f"<{tag}", 0, pos) > html.rfind(f"</{tag}", 0, pos)
+            for tag in ("script", "style")
+        ):
+            return match
     return None
 
 
+# Title plus the start of the visible text: enough to spot the block page
+# without pulling the whole serialized DOM out of the browser
+_BLOCK_PROBE_JS = (
+    "return document.title + '|' + "
+    "(document.body ? document.body.innerText.substring(0, 400) : '');"
+)
+
+
+def _is_blocked(driver) -> bool:
+    """Whether the browser is showing Zillow's "Access denied" CAPTCHA page."""
+    return "Access to this page has been denied" in driver.execute_script(_BLOCK_PROBE_JS)
+
+
 def scrape_zillow(url: str) -> float | None:
     """Extract Zestimate from a Zillow property page using Selenium."""
     driver = _get_driver()
     try:
+        RATE_LIMITER.acquire(url)
         driver.get(url)
         time.sleep(random.uniform(5, 8))
 
         # Check for CAPTCHA/block page and retry with fresh browser
-        if "Access to this page has been denied" in driver.page_source:
+        if _is_blocked(driver):
             logger.warning("Zillow CAPTCHA detected, restarting browser...")
-            cleanup_driver()
+            _discard_driver(driver, fresh_profile=True)
+            driver = None
             time.sleep(random.uniform(10, 15))
             driver = _get_driver()
+            RATE_LIMITER.acquire(url)
             driver.get(url)
             time.sleep(random.uniform(6, 10))
 
         page_source = driver.page_source
-        soup = BeautifulSoup(page_source, "lxml")
+        tree = LexborHTMLParser(page_source)
 
         # Primary selector: data-testid="primary-zestimate"
-        el = soup.select_one('[data-testid="primary-zestimate"]')
+        el = tree.css_first('[data-testid="primary-zestimate"]')
         if el:
-            price = _parse_price(el.get_text())
+            price = _parse_price(el.text())
             if price:
                 return price
 
@@ -113,16 +351,14 @@ def scrape_zillow(url: str) -> float | None:
             '[data-testid="price"]',
             'span[data-testid="zestimate-text"]',
         ]:
-            el = soup.select_one(selector)
+            el = tree.css_first(selector)
             if el:
-                price = _parse_price(el.get_text())
+                price = _parse_price(el.text())
                 if price:
                     return price
 
-        # Last resort: regex on page text
-        text = soup.get_text()
-        zestimate_pattern = re.compile(r"Zestimate[^$]*\$([0-9,]+)", re.IGNORECASE)
-        match = zestimate_pattern.search(text)
+        # Last resort: regex on the page's HTML
+        match = _search_html(_ZESTIMATE_RE, page_source)
         if match:
             return _parse_price(match.group(1))
 
@@ -131,85 +367,175 @@ def scrape_zillow(url: str) -> float | None:
     except Exception as e:
         logger.error("Selenium error fetching Zillow %s: %s", url, e)
         return None
-
-
-def scrape_redfin(url: str) -> float | None:
-    """Extract Redfin estimate from a Redfin property page."""
-    soup = _fetch_page(url)
-    if not soup:
-        return None
-
-    # Primary: regex for "Redfin Estimate" text (most reliable)
-    estimate_pattern = re.compile(r"Redfin Estimate[^$]*\$([0-9,]+)", re.IGNORECASE)
-    match = estimate_pattern.search(soup.get_text())
-    if match:
-        return _parse_price(match.group(1))
-
-    # Fallback selectors (avoid div[class*="redfin-estimate"] span[class*="value"]
-    # which incorrectly matches nearby comp sale prices)
-    for selector in [
-        'div[data-rf-test-id="avmLdpPrice"]',
-        'span[class*="EstimatePrice"]',
-    ]:
-        el = soup.select_one(selector)
-        if el:
-            price = _parse_price(el.get_text())
-            if price:
-                return price
-
-    logger.warning("Could not find Redfin estimate on page: %s", url)
-    return None
-
-
-def scrape_property(prop) -> list[ScrapeResult]:
-    """Scrape both Zillow and Redfin for a single property. Returns list of ScrapeResults."""
-    results = []
-    session = SessionLocal()
-
-    try:
-        if prop.zillow_url:
-            price = scrape_zillow(prop.zillow_url)
-            if price:
-                add_estimate(session, prop.id, "zillow", price)
-                results.append(ScrapeResult(prop.id, "zillow", True, price))
-                logger.info("Zillow estimate for %s: $%.0f", prop.address, price)
-            else:
-                results.append(ScrapeResult(prop.id, "zillow", False, error_msg="Could not extract Zestimate"))
-            # Longer delay for Zillow to avoid CAPTCHA
-            time.sleep(random.uniform(3, 6))
-
-        if prop.redfin_url:
-            price = scrape_redfin(prop.redfin_url)
-            if price:
-                add_estimate(session, prop.id, "redfin", price)
-                results.append(ScrapeResult(prop.id, "redfin", True, price))
-                logger.info("Redfin estimate for %s: $%.0f", prop.address, price)
-            else:
-                results.append(ScrapeResult(prop.id, "redfin", False, error_msg="Could not extract Redfin estimate"))
-            time.sleep(random.uniform(config.MIN_DELAY, config.MAX_DELAY))
-
-        if not prop.zillow_url and not prop.redfin_url:
-            results.append(ScrapeResult(prop.id, "none", False, error_msg="No URLs configured"))
     finally:
-        session.close()
-
-    return results
+        if driver is not None:
+            _release_driver(driver)
 
 
-def scrape_batch(properties) -> list[ScrapeResult]:
-    """Scrape a batch of properties with rate limiting between each."""
+@dataclass
+class RedfinPage:
+    price: float | None
+    selector: str | None = None  # what found the price, tried first next time
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+_REDFIN_TEXT_MATCH = "regex"  # the "Redfin Estimate ... $N" pattern, in place of a selector
+# Fallback selectors (avoid div[class*="redfin-estimate"] span[class*="value"]
+# which incorrectly matches nearby comp sale prices)
+_REDFIN_SELECTORS = (
+    'div[data-rf-test-id="avmLdpPrice"]',
+    'span[class*="EstimatePrice"]',
+)
+
+
+def _redfin_price(html: str, preferred: str | None = None) -> tuple[float | None, str | None]:
+    """Find the Redfin estimate in a page. Returns (price, selector that found it)."""
+    # The regex for "Redfin Estimate" text is the most reliable, so it goes
+    # first unless another selector worked on this page last time
+    strategies = [_REDFIN_TEXT_MATCH, *_REDFIN_SELECTORS]
+    if preferred in strategies:
+        strategies.remove(preferred)
+        strategies.insert(0, preferred)
+
+    tree = None
+    for strategy in strategies:
+        if strategy == _REDFIN_TEXT_MATCH:
+            # Runs on the raw HTML, so the page is only parsed if selectors are needed
+            match = _search_html(_REDFIN_ESTIMATE_RE, html)
+            price = _parse_price(match.group(1)) if match else None
+        else:
+            if tree is None:
+                tree = LexborHTMLParser(html)
+            el = tree.css_first(strategy)
+            price = _parse_price(el.text()) if el else None
+        if price:
+            return price, strategy
+    return None, None
+
+
+def _read_until_estimate(resp: requests.Response) -> str:
+    """Read a streamed Redfin page only as far as the "Redfin Estimate" price.
+
+    The estimate sits near the top of a page that is often over 500KB.
+    Returns the HTML read so far, which is the whole page if there's no match.
+    """
+    if resp.encoding is None:
+        resp.encoding = "utf-8"
+    html = ""
+    for chunk in resp.iter_content(chunk_size=65536, decode_unicode=True):
+        html += chunk
+        match = _search_html(_REDFIN_ESTIMATE_RE, html)
+        # A match that runs to the end of what's been read may be a cut-off price
+        if match and match.end() < len(html):
+            break
+    return html
+
+
+def fetch_redfin(url: str, known: UrlSelectorRow | None = None) -> RedfinPage:
+    """Fetch a Redfin property page and extract its estimate.
+
+    With the UrlSelectorRow from an earlier successful scrape, the request is
+    conditional and an unchanged page (304) reuses the stored price.
+    """
+    resp = _fetch_page(url, known)
+    if resp is None:
+        return RedfinPage(None)
+    # Leaving the block closes the response, dropping any unread rest of the page
+    with resp:
+        if resp.status_code == 304 and known is not None:
+            logger.debug("Redfin page unchanged: %s", url)
+            return RedfinPage(known.last_price, known.selector, known.etag, known.last_modified)
+
+        preferred = known.selector if known else None
+        try:
+            # Stop reading at the estimate text unless a selector is due to be tried first
+            html = _read_until_estimate(resp) if preferred in (None, _REDFIN_TEXT_MATCH) else resp.text
+        except requests.RequestException as e:
+            logger.error("Failed to read %s: %s", url, e)
+            return RedfinPage(None)
+
+    price, selector = _redfin_price(html, preferred)
+    if not price:
+        logger.warning("Could not find Redfin estimate on page: %s", url)
+    return RedfinPage(price, selector, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+
+
+def _result(prop: PropertyRow, source: str, price: float | None, error_msg: str) -> ScrapeResult:
+    """ScrapeResult for one scraped estimate (or the failure to find one)."""
+    if not price:
+        return ScrapeResult(prop.id, source, False, error_msg=error_msg)
+    logger.info("%s estimate for %s: $%.0f", source.capitalize(), prop.address, price)
+    return ScrapeResult(prop.id, source, True, price)
+
+
+def _save_estimates(session, results: list[ScrapeResult]) -> None:
+    """Store the estimates of all successful results in one transaction."""
+    add_estimates(session, [(r.property_id, r.source, r.price) for r in results if r.success])
+
+
+def scrape_batch(properties: list[PropertyRow]) -> list[ScrapeResult]:
+    """Scrape a batch of properties, rate limited per host by RATE_LIMITER.
+
+    Zillow pages are loaded on up to ZILLOW_BROWSERS threads, each borrowing
+    a browser from the driver pool. Meanwhile the Redfin pages, which are
+    plain HTTP, are fetched on up to config.MAX_WORKERS threads. Estimates
+    are collected and results returned property by property, as before.
+    Everything scraped, even if the batch stops early, is written at the
+    end in a single transaction.
+
+    Each Redfin page's ETag/Last-Modified and the selector that found its
+    estimate are saved in url_selectors, so the next batch can fetch it
+    conditionally and try that selector first.
+    """
     all_results = []
+    selectors = []
+    session = SessionLocal()
+    zillow_pool = ThreadPoolExecutor(max_workers=ZILLOW_BROWSERS)
+    redfin_pool = ThreadPoolExecutor(max_workers=config.MAX_WORKERS)
     try:
+        try:
+            known = get_url_selectors(session, [prop.redfin_url for prop in properties if prop.redfin_url])
+        except OperationalError:
+            session.rollback()
+            logger.warning("No url_selectors table (run 'init'); fetching every Redfin page in full")
+            known = None
+
+        zillow_prices = {}
+        redfin_pages = {}
+        for prop in properties:
+            if prop.zillow_url:
+                zillow_prices[prop.id] = zillow_pool.submit(scrape_zillow, prop.zillow_url)
+            if prop.redfin_url:
+                stored = known.get(prop.redfin_url) if known else None
+                redfin_pages[prop.id] = redfin_pool.submit(fetch_redfin, prop.redfin_url, stored)
+
         for i, prop in enumerate(properties):
             logger.info("Scraping property %d/%d: %s", i + 1, len(properties), prop.address)
-            results = scrape_property(prop)
-            all_results.extend(results)
-
-            if i < len(properties) - 1:
-                delay = random.uniform(config.MIN_DELAY, config.MAX_DELAY)
-                logger.debug("Sleeping %.1fs before next property", delay)
-                time.sleep(delay)
+            if prop.zillow_url:
+                price = zillow_prices[prop.id].result()
+                all_results.append(_result(prop, "zillow", price, "Could not extract Zestimate"))
+
+            if prop.redfin_url:
+                page = redfin_pages[prop.id].result()
+                all_results.append(_result(prop, "redfin", page.price, "Could not extract Redfin estimate"))
+                if page.price and known is not None:
+                    selectors.append(UrlSelectorRow(prop.redfin_url, page.selector, page.etag,
+                                                    page.last_modified, page.price))
+
+            if not prop.zillow_url and not prop.redfin_url:
+                all_results.append(ScrapeResult(prop.id, "none", False, error_msg="No URLs configured"))
     finally:
+        # On an early exit, drop the fetches that haven't started
+        zillow_pool.shutdown(wait=True, cancel_futures=True)
+        redfin_pool.shutdown(wait=True, cancel_futures=True)
+        try:
+            _save_estimates(session, all_results)
+            if selectors:
+                save_url_selectors(session, selectors)
+        finally:
+            session.close()
+        cleanup_session()
         cleanup_driver()
 
     successes = sum(1 for r in all_results if r.success)